@@ -0,0 +1,123 @@
+import datetime as dt
+import os
+import re
+import time
+from collections import defaultdict
+from sqlalchemy import or_, select, update
+from . import models
+from .db import iter_keyset, bulk_update
+
+APN_MATCH_CHUNK_SIZE = int(os.getenv("APN_MATCH_CHUNK_SIZE", "10000"))
+# shorter identifiers ("PARCEL 9") match too much to be useful
+APN_MIN_LENGTH = 5
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+# a label must end at a non-letter, so "PINEWOOD" or "PINE-12345" never lose a "PIN" prefix
+_LABEL_SRC = r"(?:APN|PIN|PARCEL(?:\s*(?:NO\.?|NUMBER|ID))?)(?![A-Z])"
+_LABEL = re.compile(r"^\s*" + _LABEL_SRC + r"\s*[#:.\-]?", re.IGNORECASE)
+# space-joined groups are digits only, on one line, and never a year or an amount ("2023", "1,500", "1500.00")
+_SPACE_GROUP = r" (?!(?:19|20)\d\d\b)(?!\d+[,.]\d)\d+\b"
+# a label, optional "#"/":"/"-"/"No.", then either digit groups joined by single spaces
+# or an identifier of letters/digits joined by "-" or "."
+_APN_RE = re.compile(
+    r"\b" + _LABEL_SRC + r"\s*[#:.\-]?\s*"
+    r"(\d+(?:" + _SPACE_GROUP + r")+|[A-Z0-9]+(?:[-.][A-Z0-9]+)*)",
+    re.IGNORECASE,
+)
+
+
+def normalize_apn(value: str | None) -> str | None:
+    # must stay identical to models.apn_norm_sql: upper-case, keep only A-Z and 0-9
+    norm = _NON_ALNUM.sub("", (value or "").upper())
+    return norm or None
+
+
+def event_apn(token: str | None) -> str | None:
+    # event tokens may still carry their label ("APN:012-345-67"); parcel columns never do
+    norm = normalize_apn(_LABEL.sub("", token or "")) or ""
+    return norm if len(norm) >= APN_MIN_LENGTH and any(c.isdigit() for c in norm) else None
+
+
+def extract_apns(text: str) -> dict:
+    # identifier -> the text it was found in
+    found = {}
+    for m in _APN_RE.finditer(text):
+        ident = m.group(1).strip()[:256]
+        if event_apn(ident):
+            found.setdefault(ident, m.group(0)[:1024])
+    return found
+
+
+def _parcels_for(db, norms) -> dict:
+    # the hash-join build side: normalized APN/parcel_id -> [(parcel id, state, county)], via the functional indexes
+    P = models.Parcel
+    apn, pid = models.apn_norm_sql(P.apn), models.apn_norm_sql(P.parcel_id)
+    norms = list(norms)
+    table = defaultdict(list)
+    for i in range(0, len(norms), 5000):
+        chunk = norms[i:i + 5000]
+        rows = db.execute(
+            select(P.id, P.state, P.county, apn, pid).where(or_(apn.in_(chunk), pid.in_(chunk))).order_by(P.id)
+        ).all()
+        wanted = set(chunk)
+        for parcel_id, state, county, a, b in rows:
+            for key in {a, b} & wanted:
+                table[key].append((parcel_id, (state or "").upper(), county_key(county)))
+    return table
+
+
+def county_key(county: str | None) -> str:
+    # "Travis County", "TRAVIS" and "travis county " compare equal
+    words = re.sub(r"[^\w\s]", " ", (county or "").lower()).split()
+    return " ".join(w for w in words if w not in ("county", "parish", "borough"))
+
+
+def _pick(candidates: list, state: str | None, county: str | None):
+    # APNs are only unique within a county: drop parcels in another county, then another state, and
+    # leave the event unmatched unless exactly one parcel remains. Blank values on either side don't exclude.
+    county, state = county_key(county), (state or "").upper()
+    if county:
+        candidates = [c for c in candidates if not c[2] or c[2] == county]
+    if state:
+        candidates = [c for c in candidates if not c[1] or c[1] == state]
+    return candidates[0][0] if len(candidates) == 1 else None
+
+
+def match_events(db, rematch: bool = False, chunk_size: int = APN_MATCH_CHUNK_SIZE) -> dict:
+    E, S, P = models.AuctionEvent, models.AuctionSource, models.Parcel
+    stats = {"events": 0, "matched": 0, "parcels_flagged": 0}
+    started = time.perf_counter()
+    criteria = [E.parcel_id.is_(None)]
+    if not rematch:
+        criteria.append(E.match_checked_at.is_(None))
+    cols = (E.id, E.parcel_id_text, E.apn_norm, E.source_id)
+    for rows in iter_keyset(db, cols, chunk_size, *criteria):
+        now = dt.datetime.now(dt.timezone.utc)
+        ids = [r[0] for r in rows]
+        norms = [r[2] or event_apn(r[1]) for r in rows]
+        missing = [(i, n) for i, n, r in zip(ids, norms, rows) if r[2] is None and n]
+        if missing:
+            bulk_update(db, "auction_events", "apn_norm", [i for i, _ in missing], [n for _, n in missing])
+        sources = {
+            source_id: (state, county)
+            for source_id, state, county in db.execute(select(S.id, S.state, S.county).where(S.id.in_({r[3] for r in rows if r[3]})))
+        }
+        table = _parcels_for(db, {n for n in norms if n})
+        matched = {}
+        for (event_id, _, _, source_id), norm in zip(rows, norms):
+            if norm in table:
+                parcel_id = _pick(table[norm], *sources.get(source_id, (None, None)))
+                if parcel_id is not None:
+                    matched[event_id] = parcel_id
+        if matched:
+            bulk_update(db, "auction_events", "parcel_id", list(matched), list(matched.values()))
+            flagged = db.execute(
+                update(P).where(P.id.in_(set(matched.values())), P.auction_flagged_at.is_(None)).values(auction_flagged_at=now)
+            ).rowcount
+            stats["parcels_flagged"] += flagged
+        db.execute(update(E).where(E.id.in_(ids)).values(match_checked_at=now))
+        db.commit()
+        stats["events"] += len(rows)
+        stats["matched"] += len(matched)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
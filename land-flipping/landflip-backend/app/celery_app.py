@@ -1,10 +1,56 @@
 from celery import Celery
 import os
 
+# memory:// and cache+memory:// work for local runs without redis
 broker_url = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 backend_url = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
 
-celery_app = Celery("landflip", broker=broker_url, backend=backend_url)
+# defaults for every task; short tasks set tighter limits on their decorators
+TASK_SOFT_TIME_LIMIT = int(os.getenv("CELERY_TASK_SOFT_TIME_LIMIT", "3600"))
+TASK_TIME_LIMIT = int(os.getenv("CELERY_TASK_TIME_LIMIT", "3900"))
+# with acks_late on redis an unacked task is redelivered after this, so it must outlast TASK_TIME_LIMIT
+VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", str(TASK_TIME_LIMIT * 2)))
+AUCTION_DISPATCH_SECONDS = float(os.getenv("AUCTION_DISPATCH_SECONDS", "60"))
+
+celery_app = Celery("landflip", broker=broker_url, backend=backend_url, include=["app.tasks"])
+
+# one queue per workload, each served by its own worker (see infra/docker-compose.yml), so a burst
+# of CSV ingests, campaign mail or model training never sits in front of scrape and geocode tasks
+celery_app.conf.update(
+    task_default_queue="default",
+    task_routes={
+        "app.tasks.ingest_job": {"queue": "ingest"},
+        "app.tasks.ingest_layer_task": {"queue": "ingest"},
+        "app.tasks.export_parcels_task": {"queue": "ingest"},
+        "app.tasks.reindex_owner_contacts": {"queue": "ingest"},
+        "app.tasks.resolve_owners_task": {"queue": "ingest"},
+        "app.tasks.dispatch_due_auction_sources": {"queue": "scrape"},
+        "app.tasks.crawl_auction_sources": {"queue": "scrape"},
+        "app.tasks.match_auction_events": {"queue": "scrape"},
+        "app.tasks.run_scraper": {"queue": "scrape"},
+        "app.tasks.enrich_owners_task": {"queue": "scrape"},
+        "app.tasks.geocode_address": {"queue": "geocode"},
+        "app.tasks.geocode_batch_task": {"queue": "geocode"},
+        "app.tasks.geocode_parcels_task": {"queue": "geocode"},
+        "app.tasks.train_model_task": {"queue": "ml"},
+        # a campaign runs for as long as SMTP_RATE_PER_SEC makes it (20k recipients at 10/s is ~33 min)
+        "app.tasks.send_campaign_email": {"queue": "mail"},
+    },
+    task_acks_late=True,
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1")),
+    task_soft_time_limit=TASK_SOFT_TIME_LIMIT,
+    task_time_limit=TASK_TIME_LIMIT,
+    broker_transport_options={"visibility_timeout": VISIBILITY_TIMEOUT},
+    task_always_eager=os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() in ("1", "true", "yes"),
+    beat_schedule={
+        "dispatch-due-auction-sources": {
+            "task": "app.tasks.dispatch_due_auction_sources",
+            "schedule": AUCTION_DISPATCH_SECONDS,
+            # a dispatch that waited out its own interval is superseded by the next one
+            "options": {"expires": AUCTION_DISPATCH_SECONDS},
+        },
+    },
+)
 
 @celery_app.task
 def ping():
@@ -0,0 +1,145 @@
+import asyncio
+import datetime as dt
+import hashlib
+import os
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+import httpx
+import lxml.html
+from lxml import etree
+from sqlalchemy import func, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import models
+from .apn import extract_apns, event_apn
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "32"))
+CRAWL_PER_DOMAIN = int(os.getenv("CRAWL_PER_DOMAIN", "2"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "20"))
+CRAWL_BATCH_SIZE = int(os.getenv("CRAWL_BATCH_SIZE", "200"))
+HEADERS = {"User-Agent": "landflip/1.0"}
+
+
+def page_text(content: bytes) -> str:
+    # lxml's C parser; an empty or non-HTML body yields no text. Text nodes are joined with a space so
+    # adjacent cells ("<td>APN 1</td><td>APN 2</td>") keep their word boundary
+    try:
+        doc = lxml.html.fromstring(content)
+    except (etree.ParserError, ValueError):
+        return ""
+    etree.strip_elements(doc, "script", "style", with_tail=False)
+    return " ".join(doc.itertext())
+
+
+async def _fetch(client: httpx.AsyncClient, domains: dict, source: dict) -> dict:
+    out = {"id": source["id"], "status": "failed", "tokens": {}}
+    headers = {}
+    if source["etag"]:
+        headers["If-None-Match"] = source["etag"]
+    if source["last_modified"]:
+        headers["If-Modified-Since"] = source["last_modified"]
+    try:
+        async with domains[urlsplit(source["url"]).netloc.lower()]:
+            r = await client.get(source["url"], headers=headers)
+        if r.status_code == 304:
+            out["status"] = "not_modified"
+            return out
+        r.raise_for_status()
+    except (httpx.HTTPError, ValueError) as e:
+        out["error"] = str(e) or type(e).__name__
+        return out
+    out["etag"] = r.headers.get("etag")
+    out["last_modified"] = r.headers.get("last-modified")
+    out["content_hash"] = hashlib.sha256(r.content).hexdigest()
+    if out["content_hash"] == source["content_hash"]:
+        out["status"] = "unchanged"
+        return out
+    out["status"] = "changed"
+    out["tokens"] = await asyncio.to_thread(lambda: extract_apns(page_text(r.content)))
+    return out
+
+
+async def crawl(sources: list[dict]) -> list[dict]:
+    domains = defaultdict(lambda: asyncio.Semaphore(CRAWL_PER_DOMAIN))
+    limits = httpx.Limits(max_connections=CRAWL_CONCURRENCY, max_keepalive_connections=CRAWL_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=CRAWL_TIMEOUT, headers=HEADERS, limits=limits, follow_redirects=True) as client:
+        return await asyncio.gather(*(_fetch(client, domains, s) for s in sources))
+
+
+def _store(db, results: list[dict]) -> list[int]:
+    # new events per result; events already recorded for a source are skipped by the unique key
+    S = models.AuctionSource
+    now = dt.datetime.now(dt.timezone.utc)
+    counts = []
+    for res in results:
+        events = 0
+        values = {"last_crawled_at": now, "last_error": res.get("error")}
+        if res["status"] in ("changed", "unchanged"):
+            values.update({k: res[k] for k in ("etag", "last_modified", "content_hash")})
+        db.execute(update(S).where(S.id == res["id"]).values(**values))
+        if res["tokens"]:
+            stmt = pg_insert(models.AuctionEvent).values([
+                {"source_id": res["id"], "parcel_id_text": t, "apn_norm": event_apn(t), "status": "found", "raw": raw}
+                for t, raw in res["tokens"].items()
+            ]).on_conflict_do_nothing(index_elements=["source_id", "parcel_id_text"])
+            events = db.execute(stmt).rowcount
+        counts.append(events)
+    return counts
+
+
+def crawl_batch(db, rows) -> list[dict]:
+    results = asyncio.run(crawl([dict(r) for r in rows]))
+    for res, events in zip(results, _store(db, results)):
+        res["events"] = events
+    db.commit()
+    return results
+
+
+def _source_query():
+    S = models.AuctionSource
+    return select(S.id, S.url, S.etag, S.last_modified, S.content_hash).where(S.url.isnot(None), S.url != "")
+
+
+def claim_due_sources(db) -> list[int]:
+    # moves next_crawl_at forward as it claims, so a source is queued once per interval however long its crawl waits
+    S = models.AuctionSource
+    due = (
+        _source_query()
+        .with_only_columns(S.id)
+        .where(S.crawl_interval_minutes > 0, or_(S.next_crawl_at.is_(None), S.next_crawl_at <= func.now()))
+        .with_for_update(skip_locked=True)
+    )
+    ids = db.execute(
+        update(S)
+        .where(S.id.in_(due))
+        .values(next_crawl_at=func.now() + S.crawl_interval_minutes * literal_column("interval '1 minute'"))
+        .returning(S.id)
+    ).scalars().all()
+    db.commit()
+    return sorted(ids)
+
+
+def crawl_source(db, source_id: int) -> dict | None:
+    row = db.execute(_source_query().where(models.AuctionSource.id == source_id)).mappings().first()
+    return crawl_batch(db, [row])[0] if row else None
+
+
+def crawl_sources(db, source_ids=None) -> dict:
+    S = models.AuctionSource
+    stats = {"sources": 0, "changed": 0, "unchanged": 0, "not_modified": 0, "failed": 0, "events": 0}
+    started = time.perf_counter()
+    q = _source_query()
+    if source_ids:
+        q = q.where(S.id.in_(source_ids))
+    last = 0
+    while True:
+        rows = db.execute(q.where(S.id > last).order_by(S.id).limit(CRAWL_BATCH_SIZE)).mappings().all()
+        if not rows:
+            break
+        last = rows[-1]["id"]
+        for res in crawl_batch(db, rows):
+            stats[res["status"]] += 1
+            stats["events"] += res["events"]
+        stats["sources"] += len(rows)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import DATABASE_URL
 
@@ -12,3 +12,35 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def iter_keyset(db, columns, chunk_size: int, *criteria):
+    # yields lists of rows ordered by the first column, which must be unique
+    key = columns[0]
+    last = None
+    while True:
+        q = select(*columns).where(*criteria)
+        if last is not None:
+            q = q.where(key > last)
+        rows = db.execute(q.order_by(key).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+def bulk_update(db, table: str, column: str, ids, values):
+    # one UPDATE ... FROM unnest() per chunk instead of a statement per row
+    if not ids:
+        return
+    db.execute(
+        text(f"UPDATE {table} AS t SET {column} = v.value FROM unnest(:ids, :values) AS v(id, value) WHERE t.id = v.id"),
+        {"ids": list(ids), "values": list(values)},
+    )
+
+def bulk_remap(db, table: str, column: str, old, new):
+    # rewrites column values old[i] -> new[i] in one statement, e.g. re-pointing a foreign key
+    if not old:
+        return
+    db.execute(
+        text(f"UPDATE {table} AS t SET {column} = v.new FROM unnest(:old, :new) AS v(old, new) WHERE t.{column} = v.old"),
+        {"old": list(old), "new": list(new)},
+    )
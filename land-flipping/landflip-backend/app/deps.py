@@ -1,12 +1,28 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, Header
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from typing import Optional
 from .db import get_db
 from . import models
 from .security import decode_token
 
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+@dataclass(frozen=True)
+class Principal:
+    # detached snapshot of the user row, safe to share across requests and sessions
+    id: int
+    email: str
+    name: Optional[str]
+    role: str
+
 class CurrentUser:
-    def __init__(self, user: Optional[models.User]):
+    def __init__(self, user: Optional[Principal]):
         self.user = user
 
     @property
@@ -17,15 +33,60 @@ class CurrentUser:
     def role(self) -> str:
         return self.user.role if self.user else "guest"
 
+# token -> (expires at, principal or None for a token whose user no longer exists)
+_principals: dict = {}
+_principals_lock = threading.Lock()
+
+def _cached_principal(token: str):
+    with _principals_lock:
+        entry = _principals.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _principals[token]
+            return None
+        return entry
+
+def _cache_principal(token: str, payload: dict, principal: Optional[Principal]):
+    now = time.monotonic()
+    ttl = PRINCIPAL_CACHE_TTL
+    if payload.get("exp") is not None:
+        ttl = min(ttl, float(payload["exp"]) - time.time())
+    if ttl <= 0:
+        return
+    with _principals_lock:
+        if len(_principals) >= PRINCIPAL_CACHE_SIZE:
+            # drop expired entries, or failing that the oldest tenth
+            expired = [k for k, v in _principals.items() if v[0] <= now]
+            for key in expired or list(_principals)[: max(1, PRINCIPAL_CACHE_SIZE // 10)]:
+                del _principals[key]
+        _principals[token] = (now + ttl, principal)
+
+def invalidate_principal(user_id: int):
+    with _principals_lock:
+        for key in [k for k, v in _principals.items() if v[1] is not None and v[1].id == user_id]:
+            del _principals[key]
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # only this process is notified; other workers converge within PRINCIPAL_CACHE_TTL
+    invalidate_principal(target.id)
+
 def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> CurrentUser:
     if not authorization or not authorization.lower().startswith("bearer "):
         return CurrentUser(None)
     token = authorization.split(" ", 1)[1]
+    cached = _cached_principal(token)
+    if cached is not None:
+        return CurrentUser(cached[1])
     payload = decode_token(token)
     if not payload:
         return CurrentUser(None)
     user = db.get(models.User, int(payload.get("sub")))
-    return CurrentUser(user)
+    principal = Principal(user.id, user.email, user.name, user.role) if user else None
+    _cache_principal(token, payload, principal)
+    return CurrentUser(principal)
 
 def require_role(role: str):
     def _inner(current: CurrentUser = Depends(get_current_user)):
@@ -1,11 +1,31 @@
+import asyncio
+import datetime as dt
+import os
 import re
+import time
+import httpx
 import requests
 from bs4 import BeautifulSoup
 from rapidfuzz import fuzz
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import models
+from .ratelimit import HostRateLimiter
+from .security_encryption import encrypt_value, decrypt_value, blind_index
 
 PHONE_RE = re.compile(r"(?:\+?1[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}")
 EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
 
+# any endpoint that takes ?q= and returns HTML; tests point this at a local stub
+ENRICHMENT_LOOKUP_URL = os.getenv("ENRICHMENT_LOOKUP_URL", "https://html.duckduckgo.com/html/")
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "16"))
+ENRICHMENT_RATE_PER_HOST = float(os.getenv("ENRICHMENT_RATE_PER_HOST", "10"))
+ENRICHMENT_CACHE_TTL = dt.timedelta(days=int(os.getenv("ENRICHMENT_CACHE_TTL_DAYS", "30")))
+ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", "500"))
+HEADERS = {"User-Agent": "landflip/1.0"}
+
+_EMPTY = {"phone": None, "email": None, "raw_hits": 0}
+
 
 def normalize_phone(p: str | None) -> str | None:
     if not p:
@@ -18,20 +38,175 @@ def normalize_phone(p: str | None) -> str | None:
     return p
 
 
+def normalize_name(s: str | None) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", (s or "").lower()).split())
+
+
+def cache_key(name: str | None, county: str | None = None, state: str | None = None) -> str:
+    return "|".join(normalize_name(v) for v in (name, county, state))
+
+
+def _query(name: str, county: str | None, state: str | None) -> str:
+    return f"{name} {county or ''} {state or ''} phone email"
+
+
+def parse_results(html: str) -> dict:
+    text = BeautifulSoup(html, "html.parser").get_text(" ", strip=True)
+    phones = PHONE_RE.findall(text)
+    emails = EMAIL_RE.findall(text)
+    return {
+        "phone": normalize_phone(phones[0]) if phones else None,
+        "email": emails[0] if emails else None,
+        "raw_hits": len(phones) + len(emails),
+    }
+
+
+def _fetch(name: str, county: str | None, state: str | None) -> dict:
+    r = requests.get(ENRICHMENT_LOOKUP_URL, params={"q": _query(name, county, state)}, timeout=20, headers=HEADERS)
+    r.raise_for_status()
+    return parse_results(r.text)
+
+
 def simple_web_lookup(name: str, county: str | None = None, state: str | None = None) -> dict:
-    query = f"{name} {county or ''} {state or ''} phone email"
     try:
-        r = requests.get("https://html.duckduckgo.com/html/", params={"q": query}, timeout=20, headers={"User-Agent": "landflip/1.0"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        text = soup.get_text(" ", strip=True)
-        phones = PHONE_RE.findall(text)
-        emails = EMAIL_RE.findall(text)
-        phone = normalize_phone(phones[0]) if phones else None
-        email = emails[0] if emails else None
-        return {"phone": phone, "email": email, "raw_hits": len(phones) + len(emails)}
+        return _fetch(name, county, state)
     except Exception:
-        return {"phone": None, "email": None, "raw_hits": 0}
+        return dict(_EMPTY)
+
+
+async def lookup_many(queries: dict) -> dict:
+    # queries: key -> (name, county, state); failed lookups are left out so they are retried next run
+    sem = asyncio.Semaphore(ENRICHMENT_CONCURRENCY)
+    limiter = HostRateLimiter(ENRICHMENT_RATE_PER_HOST)
+    limits = httpx.Limits(max_connections=ENRICHMENT_CONCURRENCY, max_keepalive_connections=ENRICHMENT_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=20, headers=HEADERS, limits=limits, follow_redirects=True) as client:
+        async def one(key, name, county, state):
+            async with sem:
+                await limiter.acquire(ENRICHMENT_LOOKUP_URL)
+                try:
+                    r = await client.get(ENRICHMENT_LOOKUP_URL, params={"q": _query(name, county, state)})
+                    r.raise_for_status()
+                except httpx.HTTPError:
+                    return key, None
+            # parsing is CPU-bound; keep it off the loop so other requests stay in flight
+            return key, await asyncio.to_thread(parse_results, r.text)
+
+        done = await asyncio.gather(*(one(k, *q) for k, q in queries.items()))
+    return {k: v for k, v in done if v is not None}
+
+
+def cached_results(db, keys) -> dict:
+    if not keys:
+        return {}
+    C = models.EnrichmentCache
+    rows = db.execute(
+        select(C.key, C.phone, C.email, C.raw_hits)
+        .where(C.key.in_(list(keys)), C.fetched_at >= dt.datetime.now(dt.timezone.utc) - ENRICHMENT_CACHE_TTL)
+    ).all()
+    return {
+        key: {"phone": decrypt_value(phone), "email": decrypt_value(email), "raw_hits": raw_hits or 0}
+        for key, phone, email, raw_hits in rows
+    }
+
+
+def store_results(db, results: dict) -> None:
+    if not results:
+        return
+    C = models.EnrichmentCache
+    stmt = pg_insert(C).values([
+        {"key": k, "phone": encrypt_value(r["phone"]), "email": encrypt_value(r["email"]), "raw_hits": r["raw_hits"]}
+        for k, r in results.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[C.key],
+        set_={"phone": stmt.excluded.phone, "email": stmt.excluded.email, "raw_hits": stmt.excluded.raw_hits, "fetched_at": func.now()},
+    ))
+
+
+def apply_result(owner: models.Owner, res: dict) -> bool:
+    # only fills blanks; existing contact data is never overwritten
+    updated = False
+    if res.get("phone") and not owner.phone:
+        phone = normalize_phone(res["phone"])
+        owner.phone = encrypt_value(phone)
+        owner.phone_bidx = blind_index(phone, "phone")
+        updated = True
+    if res.get("email") and not owner.email:
+        owner.email = encrypt_value(res["email"])
+        owner.email_bidx = blind_index(res["email"], "email")
+        updated = True
+    return updated
+
+
+def owner_location(db, owner_id: int) -> tuple:
+    P = models.Parcel
+    row = db.execute(select(func.min(P.county), func.min(P.state)).where(P.owner_id == owner_id)).first()
+    return tuple(row) if row else (None, None)
+
+
+def lookup_cached(db, name: str, county: str | None = None, state: str | None = None) -> dict:
+    key = cache_key(name, county, state)
+    hit = cached_results(db, [key]).get(key)
+    if hit is not None:
+        return hit
+    try:
+        res = _fetch(name, county, state)
+    except Exception:
+        return dict(_EMPTY)
+    store_results(db, {key: res})
+    return res
+
+
+def _targets(db, campaign_id, state, county, owner_ids, chunk_size: int):
+    # owners with a name and a missing contact field, with a county/state taken from their parcels
+    O, P = models.Owner, models.Parcel
+    q = (
+        select(O.id, O.name, func.min(P.county), func.min(P.state))
+        .outerjoin(P, P.owner_id == O.id)
+        .where(O.name.isnot(None), O.name != "", or_(O.phone.is_(None), O.email.is_(None)))
+        .group_by(O.id)
+    )
+    if campaign_id is not None:
+        q = q.where(P.campaign_id == campaign_id)
+    if state:
+        q = q.where(P.state == state)
+    if county:
+        q = q.where(P.county == county)
+    if owner_ids:
+        q = q.where(O.id.in_(owner_ids))
+    last = None
+    while True:
+        page = q if last is None else q.where(O.id > last)
+        rows = db.execute(page.order_by(O.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def enrich_owners(db, campaign_id=None, state=None, county=None, owner_ids=None, refresh: bool = False) -> dict:
+    stats = {"owners": 0, "cache_hits": 0, "lookups": 0, "failed": 0, "updated": 0}
+    started = time.perf_counter()
+    for rows in _targets(db, campaign_id, state, county, owner_ids, ENRICHMENT_BATCH_SIZE):
+        keys = {row[0]: cache_key(row[1], row[2], row[3]) for row in rows}
+        # refresh ignores cached entries and re-fetches them
+        results = {} if refresh else cached_results(db, set(keys.values()))
+        stats["cache_hits"] += sum(1 for k in keys.values() if k in results)
+        queries = {}
+        for owner_id, name, c, s in rows:
+            if keys[owner_id] not in results:
+                queries.setdefault(keys[owner_id], (name, c, s))
+        fetched = asyncio.run(lookup_many(queries)) if queries else {}
+        stats["lookups"] += len(queries)
+        stats["failed"] += len(queries) - len(fetched)
+        store_results(db, fetched)
+        results.update(fetched)
+        owners = db.query(models.Owner).filter(models.Owner.id.in_([k for k, v in keys.items() if v in results])).all()
+        stats["updated"] += sum(apply_result(o, results[keys[o.id]]) for o in owners)
+        db.commit()
+        stats["owners"] += len(rows)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
 
 
 def fuzzy_match(target: str, candidate: str) -> int:
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import datetime as dt
+import io
+import json
+import os
+import re
+import shutil
+import time
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from sqlalchemy import Float, LargeBinary, cast, func, select
+from sqlalchemy.orm import Session
+from . import models
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/app/data/exports")
+BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+# pyarrow refuses a batch spanning more partitions than this (default 1024; the US has ~3,100 counties)
+MAX_PARTITIONS = int(os.getenv("EXPORT_MAX_PARTITIONS", "100000"))
+MAX_OPEN_FILES = int(os.getenv("EXPORT_MAX_OPEN_FILES", "512"))
+PARTITION_KEYS = ("state", "county", "campaign_id")
+MANIFEST = "_snapshot.json"
+
+_SNAPSHOT_RE = re.compile(r"^[0-9]{8}T[0-9]{12}Z$")
+
+_P = models.Parcel
+# (column expression, arrow type); numerics are cast to float8 so batches build without Decimal conversion
+PARCEL_COLUMNS = [
+    (_P.id, pa.int64()),
+    (_P.parcel_id, pa.string()),
+    (_P.apn, pa.string()),
+    (_P.owner_name, pa.string()),
+    (_P.owner_id, pa.int64()),
+    (_P.county, pa.string()),
+    (_P.state, pa.string()),
+    (_P.country, pa.string()),
+    (cast(_P.acreage, Float).label("acreage"), pa.float64()),
+    (cast(_P.delinquency_years, Float).label("delinquency_years"), pa.float64()),
+    (_P.address, pa.string()),
+    (_P.status, pa.string()),
+    (_P.score, pa.int32()),
+    (cast(_P.valuation, Float).label("valuation"), pa.float64()),
+    (cast(_P.offer_min, Float).label("offer_min"), pa.float64()),
+    (cast(_P.offer_max, Float).label("offer_max"), pa.float64()),
+    (_P.campaign_id, pa.int64()),
+    (_P.created_at, pa.timestamp("us", tz="UTC")),
+    (_P.updated_at, pa.timestamp("us", tz="UTC")),
+    (func.ST_AsBinary(_P.geom, type_=LargeBinary).label("geom_wkb"), pa.binary()),
+]
+
+
+def _partitioning(partition_by: list[str]) -> ds.Partitioning | None:
+    # the exported types, so readers do not re-infer them from directory names ("001" is not 1)
+    if not partition_by:
+        return None
+    types = {c.key: t for c, t in PARCEL_COLUMNS}
+    return ds.partitioning(pa.schema([(k, types[k]) for k in partition_by]), flavor="hive")
+
+
+def _query(state, county, campaign_id, with_owners: bool, with_interactions: bool, partition_by: list[str]):
+    columns = list(PARCEL_COLUMNS)
+    joins = []
+    if with_owners:
+        # owner contact fields are encrypted PII and stay out of analytics snapshots
+        columns += [
+            (models.Owner.name.label("owner_canonical_name"), pa.string()),
+            (models.Owner.country.label("owner_country"), pa.string()),
+        ]
+        joins.append((models.Owner, models.Owner.id == _P.owner_id))
+    if with_interactions:
+        counts = (
+            select(models.Interaction.parcel_id, func.count(models.Interaction.id).label("n"))
+            .group_by(models.Interaction.parcel_id)
+            .subquery()
+        )
+        columns.append((func.coalesce(counts.c.n, 0).label("interaction_count"), pa.int64()))
+        joins.append((counts, counts.c.parcel_id == _P.id))
+    q = select(*(c for c, _ in columns))
+    for target, on in joins:
+        q = q.outerjoin(target, on)
+    if state:
+        q = q.where(_P.state == state)
+    if county:
+        q = q.where(_P.county == county)
+    if campaign_id is not None:
+        q = q.where(_P.campaign_id == campaign_id)
+    schema = pa.schema([(c.key, t) for c, t in columns])
+    # rows arrive grouped by partition, so each output file is finished before the next one opens
+    return q.order_by(*(getattr(_P, k) for k in partition_by), _P.id), schema
+
+
+def _batches(db: Session, q, schema: pa.Schema, stats: dict):
+    # server-side cursor: only one partition of rows is resident at a time
+    result = db.execute(q, execution_options={"stream_results": True, "yield_per": BATCH_SIZE})
+    for rows in result.partitions():
+        stats["rows"] += len(rows)
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def _snapshot_dir(snapshot_id: str) -> str:
+    if not _SNAPSHOT_RE.match(snapshot_id):
+        raise FileNotFoundError(snapshot_id)
+    return os.path.join(EXPORT_DIR, "parcels", snapshot_id)
+
+
+def export_parcels(
+    db: Session,
+    state: str | None = None,
+    county: str | None = None,
+    campaign_id: int | None = None,
+    with_owners: bool = False,
+    with_interactions: bool = False,
+    partition_by: list[str] | None = None,
+) -> dict:
+    partition_by = [k for k in (partition_by or ["state"]) if k in PARTITION_KEYS]
+    snapshot_id = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    final = _snapshot_dir(snapshot_id)
+    tmp = final + ".tmp"
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    q, schema = _query(state, county, campaign_id, with_owners, with_interactions, partition_by)
+    stats = {"rows": 0}
+    started = time.perf_counter()
+    try:
+        ds.write_dataset(
+            _batches(db, q, schema, stats),
+            tmp,
+            schema=schema,
+            format="parquet",
+            partitioning=_partitioning(partition_by),
+            max_rows_per_group=BATCH_SIZE,
+            max_partitions=MAX_PARTITIONS,
+            max_open_files=MAX_OPEN_FILES,
+        )
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    manifest = {
+        "snapshot_id": snapshot_id,
+        "rows": stats["rows"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "partition_by": partition_by,
+        "filters": {"state": state, "county": county, "campaign_id": campaign_id},
+        "with_owners": with_owners,
+        "with_interactions": with_interactions,
+        "created_at": dt.datetime.utcnow().isoformat() + "Z",
+    }
+    os.makedirs(tmp, exist_ok=True)
+    with open(os.path.join(tmp, MANIFEST), "w") as fh:
+        json.dump(manifest, fh)
+    # snapshots appear complete or not at all
+    os.replace(tmp, final)
+    return manifest
+
+
+def list_snapshots() -> list[dict]:
+    root = os.path.join(EXPORT_DIR, "parcels")
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for name in sorted(os.listdir(root), reverse=True):
+        path = os.path.join(root, name, MANIFEST)
+        if _SNAPSHOT_RE.match(name) and os.path.exists(path):
+            with open(path) as fh:
+                out.append(json.load(fh))
+    return out
+
+
+def snapshot_manifest(snapshot_id: str) -> dict:
+    with open(os.path.join(_snapshot_dir(snapshot_id), MANIFEST)) as fh:
+        return json.load(fh)
+
+
+def open_snapshot(snapshot_id: str) -> ds.Dataset:
+    # memory-mapped: column buffers come straight from the page cache
+    return ds.dataset(
+        _snapshot_dir(snapshot_id),
+        format="parquet",
+        partitioning=_partitioning(snapshot_manifest(snapshot_id)["partition_by"]),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+
+def read_snapshot(snapshot_id: str, columns: list[str] | None = None, filters=None) -> pa.Table:
+    partitioning = _partitioning(snapshot_manifest(snapshot_id)["partition_by"])
+    return pq.read_table(_snapshot_dir(snapshot_id), columns=columns, filters=filters, memory_map=True, partitioning=partitioning)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def stream_snapshot(snapshot_id: str, columns: list[str] | None = None, filter=None):
+    # Arrow IPC stream, one message per record batch, so HTTP readers get the same bounded-memory scan
+    scanner = open_snapshot(snapshot_id).scanner(columns=columns, filter=filter, batch_size=BATCH_SIZE)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, scanner.projected_schema) as writer:
+        yield _drain(sink)
+        for batch in scanner.to_batches():
+            writer.write_batch(batch)
+            yield _drain(sink)
+    yield _drain(sink)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import contextlib
+import datetime as dt
+import fcntl
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from . import models
+from .db import iter_keyset
+from .ml import MODEL_PATH, ENCODING_VERSION, N_FEATURES, features_matrix, training_targets
+
+# Feature rows live in a memory-mapped .npy indexed directly by parcel id, with a
+# parallel presence mask, so updates are in-place writes. Reads of a contiguous id range
+# are zero-copy views; any other set of ids is gathered into a copy.
+FEATURE_DIR = os.getenv("FEATURE_DIR", os.path.join(os.path.dirname(MODEL_PATH) or ".", "features"))
+CHUNK_SIZE = int(os.getenv("FEATURE_CHUNK_SIZE", "50000"))
+# rows touched by transactions still open at the previous sync are picked up by re-reading this window
+SYNC_OVERLAP = dt.timedelta(minutes=int(os.getenv("FEATURE_SYNC_OVERLAP_MINUTES", "60")))
+
+_FEATURES = "features.npy"
+_PRESENT = "present.npy"
+_META = "meta.json"
+
+
+def _path(name: str) -> str:
+    return os.path.join(FEATURE_DIR, name)
+
+
+@contextlib.contextmanager
+def _locked():
+    os.makedirs(FEATURE_DIR, exist_ok=True)
+    with open(_path("lock"), "w") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read_meta() -> dict:
+    try:
+        with open(_path(_META)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta: dict) -> None:
+    tmp = _path(_META + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, _path(_META))
+
+
+def _grow(name: str, shape: tuple, dtype) -> np.memmap:
+    path = _path(name)
+    old = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+    if old is not None and old.shape[0] >= shape[0]:
+        return np.load(path, mmap_mode="r+")
+    tmp = path + ".tmp"
+    new = open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+    if old is not None:
+        new[: old.shape[0]] = old
+    new.flush()
+    del new
+    # readers holding the old mapping keep a consistent, if stale, view
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r+")
+
+
+def _capacity(needed: int) -> int:
+    return max(1024, 1 << (needed - 1).bit_length())
+
+
+def load() -> tuple[np.memmap, np.memmap] | None:
+    try:
+        return np.load(_path(_FEATURES), mmap_mode="r"), np.load(_path(_PRESENT), mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+
+def present_ids() -> np.ndarray:
+    store = load()
+    if store is None:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(store[1])
+
+
+def lookup(ids) -> tuple[np.ndarray, np.ndarray]:
+    # returns the stored rows for ids that have them, and the mask of those ids
+    ids = np.asarray(ids, dtype=np.int64)
+    store = load()
+    if store is None:
+        return np.empty((0, N_FEATURES)), np.zeros(len(ids), dtype=bool)
+    features, present = store
+    known = (ids >= 0) & (ids < len(present))
+    known[known] = present[ids[known]]
+    if len(ids) and known.all() and ids[-1] - ids[0] == len(ids) - 1 and (np.diff(ids) == 1).all():
+        # ascending run without gaps (e.g. a chunk of present_ids over densely numbered parcels)
+        return features[ids[0]:ids[-1] + 1], known
+    return features[ids[known]], known
+
+
+def _forget_deleted(db: Session, present: np.memmap) -> None:
+    # ids of deleted parcels leave no updated_at to find, so clear every stored id the table no longer has
+    alive = np.zeros(len(present), dtype=bool)
+    P = models.Parcel
+    for rows in iter_keyset(db, (P.id,), CHUNK_SIZE * 4):
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        alive[ids[ids < len(alive)]] = True
+    present &= alive
+    present.flush()
+
+
+def sync(db: Session, full: bool = False) -> int:
+    with _locked():
+        meta = _read_meta()
+        if meta.get("encoding") != ENCODING_VERSION:
+            full = True
+        if full:
+            for name in (_FEATURES, _PRESENT, _META):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(_path(name))
+        started = db.execute(select(func.now())).scalar()
+        P = models.Parcel
+        criteria = []
+        if not full and meta.get("synced_at"):
+            criteria.append(P.updated_at >= dt.datetime.fromisoformat(meta["synced_at"]) - SYNC_OVERLAP)
+        written = 0
+        for rows in iter_keyset(db, (P.id, P.acreage, P.county, P.state), CHUNK_SIZE, *criteria):
+            ids, acreage, counties, states = zip(*rows)
+            ids = np.asarray(ids, dtype=np.int64)
+            capacity = _capacity(int(ids.max()) + 1)
+            features = _grow(_FEATURES, (capacity, N_FEATURES), np.float64)
+            present = _grow(_PRESENT, (capacity,), np.bool_)
+            features[ids] = features_matrix(acreage, counties, states)
+            present[ids] = True
+            features.flush()
+            present.flush()
+            written += len(ids)
+        if not full and os.path.exists(_path(_PRESENT)):
+            _forget_deleted(db, np.load(_path(_PRESENT), mmap_mode="r+"))
+        _write_meta({"encoding": ENCODING_VERSION, "synced_at": started.isoformat()})
+        return written
+
+
+def training_set(db: Session) -> tuple[np.ndarray, np.ndarray]:
+    sync(db)
+    ids, targets = [], []
+    P = models.Parcel
+    for rows in iter_keyset(db, (P.id, P.valuation, P.acreage), CHUNK_SIZE):
+        chunk_ids, valuations, acreage = zip(*rows)
+        ids.append(np.asarray(chunk_ids, dtype=np.int64))
+        targets.append(training_targets(valuations, acreage))
+    if not ids:
+        return np.empty((0, N_FEATURES)), np.empty(0)
+    # rows inserted after the sync have no stored features yet
+    X, known = lookup(np.concatenate(ids))
+    return X, np.concatenate(targets)[known]
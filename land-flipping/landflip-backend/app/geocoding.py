@@ -0,0 +1,235 @@
+import asyncio
+import datetime as dt
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import httpx
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import models
+from .db import iter_keyset
+from .ratelimit import shared_bucket
+
+# any Nominatim-compatible search endpoint (?q=&format=json&limit=1); tests point this at a local stub
+GEOCODER_URL = os.getenv("GEOCODER_URL", "https://nominatim.openstreetmap.org/search")
+# the public Nominatim usage policy allows one request per second
+GEOCODER_RATE_PER_SEC = float(os.getenv("GEOCODER_RATE_PER_SEC", "1"))
+GEOCODER_CONCURRENCY = int(os.getenv("GEOCODER_CONCURRENCY", "4"))
+GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", "20"))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "10000"))
+# addresses the provider could not place are asked again after this long; found points are kept
+GEOCODE_MISS_TTL = dt.timedelta(days=int(os.getenv("GEOCODE_MISS_TTL_DAYS", "30")))
+GEOCODE_BATCH_SIZE = int(os.getenv("GEOCODE_BATCH_SIZE", "500"))
+HEADERS = {"User-Agent": "landflip/1.0"}
+
+_ABBREV = {
+    "street": "st", "road": "rd", "avenue": "ave", "drive": "dr", "lane": "ln", "boulevard": "blvd",
+    "court": "ct", "place": "pl", "circle": "cir", "highway": "hwy", "parkway": "pkwy", "route": "rte",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+}
+
+# normalized address -> (lat, lon); only found points, so misses still honour GEOCODE_MISS_TTL
+_lru: OrderedDict = OrderedDict()
+_lru_lock = threading.Lock()
+
+# one budget for the provider across the API and every worker process (kept in Redis; see RATE_LIMIT_URL)
+_bucket = shared_bucket("geocoder", GEOCODER_RATE_PER_SEC)
+_client: httpx.AsyncClient | None = None
+
+
+def normalize_address(address: str | None) -> str:
+    tokens = re.sub(r"[^\w\s]", " ", (address or "").lower()).split()
+    return " ".join(_ABBREV.get(t, t) for t in tokens)
+
+
+def _lru_get(keys) -> dict:
+    found = {}
+    with _lru_lock:
+        for key in keys:
+            if key in _lru:
+                _lru.move_to_end(key)
+                found[key] = _lru[key]
+    return found
+
+
+def _lru_put(points: dict) -> None:
+    with _lru_lock:
+        for key, point in points.items():
+            if point is not None:
+                _lru[key] = point
+                _lru.move_to_end(key)
+        while len(_lru) > GEOCODE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def new_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=GEOCODER_CONCURRENCY, max_keepalive_connections=GEOCODER_CONCURRENCY)
+    return httpx.AsyncClient(timeout=GEOCODER_TIMEOUT, headers=HEADERS, limits=limits, follow_redirects=True)
+
+
+def shared_client() -> httpx.AsyncClient:
+    # the API's pooled client, reused by every request on the server's loop; workers open one per batch
+    global _client
+    if _client is None or _client.is_closed:
+        _client = new_client()
+    return _client
+
+
+async def close_shared_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def parse_response(data) -> tuple | None:
+    if not data:
+        return None
+    return float(data[0]["lat"]), float(data[0]["lon"])
+
+
+async def fetch_many(queries: dict, client: httpx.AsyncClient | None = None) -> dict:
+    # queries: key -> address; returns key -> (lat, lon) or None, leaving out failed requests so they are retried
+    if client is None:
+        async with new_client() as client:
+            return await fetch_many(queries, client)
+    sem = asyncio.Semaphore(GEOCODER_CONCURRENCY)
+
+    async def one(key, address):
+        async with sem:
+            await _bucket.acquire()
+            try:
+                r = await client.get(GEOCODER_URL, params={"q": address, "format": "json", "limit": 1})
+                r.raise_for_status()
+                return key, parse_response(r.json())
+            except (httpx.HTTPError, ValueError, KeyError, IndexError, TypeError):
+                return key, False
+
+    done = await asyncio.gather(*(one(k, a) for k, a in queries.items()))
+    return {k: v for k, v in done if v is not False}
+
+
+def cached_points(db, keys) -> dict:
+    C = models.GeocodeCache
+    keys = list(keys)
+    cutoff = dt.datetime.now(dt.timezone.utc) - GEOCODE_MISS_TTL
+    found = {}
+    for i in range(0, len(keys), 5000):
+        rows = db.execute(
+            select(C.key, C.lat, C.lon).where(C.key.in_(keys[i:i + 5000]), or_(C.lat.isnot(None), C.fetched_at >= cutoff))
+        ).all()
+        for key, lat, lon in rows:
+            found[key] = (lat, lon) if lat is not None else None
+    return found
+
+
+def store_points(db, points: dict) -> None:
+    if not points:
+        return
+    C = models.GeocodeCache
+    stmt = pg_insert(C).values([
+        {"key": k, "lat": p[0] if p else None, "lon": p[1] if p else None} for k, p in points.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[C.key],
+        set_={"lat": stmt.excluded.lat, "lon": stmt.excluded.lon, "fetched_at": func.now()},
+    ))
+
+
+def _plan(db, addresses, refresh: bool) -> tuple[dict, dict, dict]:
+    # address -> key, key -> known point (LRU first, then the table), key -> address still to fetch
+    keys = {a: normalize_address(a) for a in addresses}
+    # a blank address has nothing to look up
+    known = {"": None}
+    if not refresh:
+        known.update(_lru_get(set(keys.values())))
+        rest = set(keys.values()) - set(known)
+        if rest:
+            from_db = cached_points(db, rest)
+            _lru_put(from_db)
+            known.update(from_db)
+    queries = {}
+    for address, key in keys.items():
+        if key not in known:
+            queries.setdefault(key, address)
+    return keys, known, queries
+
+
+def _finish(db, keys: dict, known: dict, fetched: dict) -> dict:
+    store_points(db, fetched)
+    db.commit()
+    _lru_put(fetched)
+    known.update(fetched)
+    return {a: known[k] for a, k in keys.items() if k in known}
+
+
+def geocode_batch(db, addresses, refresh: bool = False) -> dict:
+    # address -> (lat, lon), or None when the provider has no match; addresses that failed are absent
+    keys, known, queries = _plan(db, addresses, refresh)
+    fetched = asyncio.run(fetch_many(queries)) if queries else {}
+    return _finish(db, keys, known, fetched)
+
+
+async def geocode_batch_async(db, addresses, refresh: bool = False) -> dict:
+    keys, known, queries = await asyncio.to_thread(_plan, db, addresses, refresh)
+    fetched = {}
+    if queries:
+        fetched = await fetch_many(queries, shared_client())
+    return await asyncio.to_thread(_finish, db, keys, known, fetched)
+
+
+def result_row(address: str, results: dict) -> dict:
+    if address not in results:
+        return {"address": address, "status": "failed"}
+    point = results[address]
+    if point is None:
+        return {"address": address, "status": "not_found"}
+    return {"address": address, "status": "found", "lat": point[0], "lon": point[1]}
+
+
+def parcel_address(address: str | None, state: str | None) -> str | None:
+    if not address or not address.strip():
+        return None
+    if state and state.lower() not in address.lower():
+        return f"{address}, {state}"
+    return address
+
+
+def _write_locations(db, ids, points) -> None:
+    # one UPDATE ... FROM unnest() per batch, like db.bulk_update, building the points in SQL
+    if not ids:
+        return
+    db.execute(
+        text(
+            "UPDATE parcels AS t SET location = ST_SetSRID(ST_MakePoint(v.lon, v.lat), 4326) "
+            "FROM unnest(:ids, :lons, :lats) AS v(id, lon, lat) WHERE t.id = v.id"
+        ),
+        {"ids": list(ids), "lons": [p[1] for p in points], "lats": [p[0] for p in points]},
+    )
+
+
+def geocode_parcels(db, parcel_ids=None, campaign_id=None, refresh: bool = False) -> dict:
+    P = models.Parcel
+    stats = {"parcels": 0, "located": 0, "not_found": 0, "failed": 0}
+    started = time.perf_counter()
+    criteria = [P.address.isnot(None), P.address != ""]
+    if not refresh:
+        criteria.append(P.location.is_(None))
+    if parcel_ids:
+        criteria.append(P.id.in_(parcel_ids))
+    if campaign_id is not None:
+        criteria.append(P.campaign_id == campaign_id)
+    for rows in iter_keyset(db, (P.id, P.address, P.state), GEOCODE_BATCH_SIZE, *criteria):
+        queries = {pid: parcel_address(address, state) for pid, address, state in rows}
+        results = geocode_batch(db, {q for q in queries.values() if q}, refresh=refresh)
+        located = {pid: results[q] for pid, q in queries.items() if results.get(q)}
+        _write_locations(db, list(located), list(located.values()))
+        db.commit()
+        stats["parcels"] += len(rows)
+        stats["located"] += len(located)
+        stats["not_found"] += sum(1 for q in queries.values() if q in results and results[q] is None)
+        stats["failed"] += sum(1 for q in queries.values() if q and q not in results)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
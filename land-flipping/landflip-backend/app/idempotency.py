@@ -0,0 +1,85 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from celery import current_task
+import redis
+
+# where task keys live; memory:// keeps them in-process for local runs with the in-memory broker
+IDEMPOTENCY_URL = os.getenv("IDEMPOTENCY_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1"))
+
+# delete the key only if we still hold it, so an expired-and-reclaimed key is left alone
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class MemoryStore:
+    def __init__(self):
+        self._keys: dict[str, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, token: str, ttl: int) -> str:
+        now = time.monotonic()
+        with self._lock:
+            held = self._keys.get(key)
+            if held is None or held[1] <= now:
+                self._keys[key] = (token, now + ttl)
+                return token
+            return held[0]
+
+    def release(self, key: str, token: str) -> None:
+        with self._lock:
+            if self._keys.get(key, (None,))[0] == token:
+                del self._keys[key]
+
+
+class RedisStore:
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._release = self.client.register_script(_RELEASE)
+
+    def claim(self, key: str, token: str, ttl: int) -> str:
+        if self.client.set(key, token, nx=True, ex=ttl):
+            return token
+        return self.client.get(key) or self.claim(key, token, ttl)
+
+    def release(self, key: str, token: str) -> None:
+        self._release(keys=[key], args=[token])
+
+
+_store = None
+
+
+def store():
+    global _store
+    if _store is None:
+        _store = RedisStore(IDEMPOTENCY_URL) if IDEMPOTENCY_URL.startswith(("redis://", "rediss://")) else MemoryStore()
+    return _store
+
+
+def task_key(name: str, args: tuple, kwargs: dict) -> str:
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return f"landflip:task:{name}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def idempotent(ttl: int):
+    # one run per (task, arguments) at a time; a duplicate submission returns without doing the work.
+    # The key holds the celery task id, so a redelivery of the same message (acks_late) still runs.
+    # ttl should cover the task's hard time limit, since a killed worker never releases its key.
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = task_key(fn.__name__, args, kwargs)
+            request = current_task.request if current_task else None
+            token = (request.id if request else None) or uuid.uuid4().hex
+            holder = store().claim(key, token, ttl)
+            if holder != token:
+                return {"status": "duplicate", "running_task_id": holder}
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                store().release(key, token)
+        return wrapper
+    return decorator
@@ -0,0 +1,384 @@
+from __future__ import annotations
+import io
+import itertools
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from typing import Iterable, Iterator
+import fiona
+import geopandas as gpd
+import numpy as np
+import openpyxl
+import pandas as pd
+import shapely
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import Session
+from . import models, tiles
+
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "20000"))
+INGEST_DIR = os.getenv("INGEST_DIR", "/app/uploads")
+
+JOB_KINDS = {".csv": "csv", ".txt": "csv", ".xlsx": "xlsx", ".xls": "xlsx", ".zip": "shapefile"}
+
+TEXT_FIELDS = ("parcel_id", "apn", "owner_name", "county", "state", "country", "address", "status")
+NUMERIC_FIELDS = ("acreage", "delinquency_years")
+COPY_COLUMNS = TEXT_FIELDS + NUMERIC_FIELDS + ("geom",)
+COPY_SQL = f"COPY parcels ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# lower-cased source column names accepted for each parcel field, in priority order
+COLUMN_ALIASES = {
+    "parcel_id": ("parcel_id", "parcelid", "parcel"),
+    "apn": ("apn",),
+    "owner_name": ("owner", "owner_name"),
+    "county": ("county",),
+    "state": ("state",),
+    "country": ("country",),
+    "acreage": ("acreage", "acres", "size_acres"),
+    "delinquency_years": ("delinquency_years", "years_delinquent", "delinquent_years"),
+    "address": ("address",),
+    "status": ("status",),
+    "geom_wkt": ("geom_wkt", "wkt", "geometry"),
+}
+
+# shapefiles commonly carry only an APN, which doubles as the parcel id
+SHAPEFILE_ALIASES = {**COLUMN_ALIASES, "parcel_id": COLUMN_ALIASES["parcel_id"] + ("apn",)}
+
+_POLYGON = 3
+_MULTIPOLYGON = 6
+
+
+def resolve_columns(columns: Iterable, aliases: dict = COLUMN_ALIASES) -> dict[str, str]:
+    lookup = {}
+    for c in columns:
+        lookup.setdefault(str(c).lower().strip(), c)
+    resolved = {}
+    for field, names in aliases.items():
+        for name in names:
+            if name in lookup:
+                resolved[field] = lookup[name]
+                break
+    return resolved
+
+
+def geoms_to_ewkb(geoms: np.ndarray) -> np.ndarray:
+    geoms = np.asarray(geoms, dtype=object)
+    # a MultiPolygon with one part is a Polygon in a wrapper (common in shapefiles); anything else
+    # that is not a Polygon does not fit parcels.geom and becomes NULL
+    single = (shapely.get_type_id(geoms) == _MULTIPOLYGON) & (shapely.get_num_geometries(geoms) == 1)
+    geoms = np.where(single, shapely.get_geometry(geoms, 0), geoms)
+    keep = (shapely.get_type_id(geoms) == _POLYGON) & ~shapely.is_empty(geoms)
+    geoms = np.where(keep, geoms, None)
+    geoms = shapely.set_srid(geoms, 4326)
+    return shapely.to_wkb(geoms, hex=True, include_srid=True)
+
+
+def wkt_to_ewkb(text: np.ndarray) -> np.ndarray:
+    return geoms_to_ewkb(shapely.from_wkt(text, on_invalid="ignore"))
+
+
+def _text_column(df: pd.DataFrame, src, length: int | None) -> pd.Series:
+    if src is None:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    s = df[src].astype("string").str.strip()
+    s = s.mask(s == "")
+    return s.str.slice(0, length) if length else s
+
+
+def normalize_frame(df: pd.DataFrame, columns: dict[str, str], defaults: dict | None = None, geoms=None) -> pd.DataFrame:
+    defaults = {"status": "lead", **(defaults or {})}
+    table = models.Parcel.__table__
+    out = pd.DataFrame(index=df.index)
+    for field in TEXT_FIELDS:
+        s = _text_column(df, columns.get(field), table.c[field].type.length)
+        if field in defaults:
+            s = s.fillna(defaults[field])
+        out[field] = s
+    for field in NUMERIC_FIELDS:
+        if field in columns:
+            out[field] = pd.to_numeric(df[columns[field]], errors="coerce")
+        else:
+            out[field] = np.nan
+    if geoms is not None:
+        geoms = np.asarray(geoms, dtype=object)
+        present = ~shapely.is_missing(geoms)
+        out["geom"] = geoms_to_ewkb(geoms)
+    elif "geom_wkt" in columns:
+        text = _text_column(df, columns["geom_wkt"], None).to_numpy(dtype=object, na_value=None)
+        present = pd.notna(text)
+        out["geom"] = wkt_to_ewkb(text)
+    else:
+        present = False
+        out["geom"] = None
+    # rows that came with a geometry parcels.geom could not take (points, lines, multi-part
+    # polygons, invalid WKT); counted in the job stats rather than dropped silently
+    out["geom_dropped"] = present & out["geom"].isna().to_numpy()
+    return out
+
+
+def csv_batches(fileobj, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    try:
+        reader = pd.read_csv(
+            fileobj,
+            chunksize=batch_size,
+            dtype=str,
+            keep_default_na=False,
+            encoding="utf-8",
+            encoding_errors="ignore",
+            on_bad_lines="skip",
+        )
+    except pd.errors.EmptyDataError:
+        return
+    columns = None
+    for chunk in reader:
+        if columns is None:
+            columns = resolve_columns(chunk.columns)
+        yield normalize_frame(chunk, columns)
+
+
+def _unique_header(header) -> list[str]:
+    seen: dict[str, int] = {}
+    out = []
+    for i, h in enumerate(header):
+        name = str(h).strip() if h is not None else f"column_{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        out.append(name)
+    return out
+
+
+def _sheet_batches(wb, batch_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = _unique_header(header)
+        columns = resolve_columns(header)
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                break
+            df = pd.DataFrame(chunk, dtype=object).reindex(columns=range(len(header)))
+            df.columns = header
+            df = df.dropna(how="all")
+            yield normalize_frame(df, columns)
+    finally:
+        wb.close()
+
+
+def _frame_batches(df: pd.DataFrame, batch_size: int) -> Iterator[pd.DataFrame]:
+    df.columns = _unique_header(df.columns)
+    columns = resolve_columns(df.columns)
+    for start in range(0, len(df), batch_size):
+        yield normalize_frame(df.iloc[start:start + batch_size], columns)
+
+
+def xlsx_batches(fileobj, filename: str, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    # opens eagerly so unreadable workbooks fail before any rows are loaded
+    if filename.lower().endswith(".xls"):
+        return _frame_batches(pd.read_excel(fileobj, dtype=object), batch_size)
+    return _sheet_batches(openpyxl.load_workbook(fileobj, read_only=True, data_only=True), batch_size)
+
+
+def archive_layers(directory: str) -> list[tuple[str, str | None]]:
+    layers = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.lower().endswith(".shp"):
+                layers.append((path, None))
+            elif name.lower().endswith(".gpkg"):
+                layers.extend((path, layer) for layer in fiona.listlayers(path))
+    return layers
+
+
+def layer_batches(path: str, layer: str | None = None, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    with fiona.open(path, layer=layer) as src:
+        crs = src.crs_wkt or None
+        columns = resolve_columns(src.schema["properties"].keys(), SHAPEFILE_ALIASES)
+        features = iter(src)
+        while True:
+            chunk = list(itertools.islice(features, batch_size))
+            if not chunk:
+                break
+            gdf = gpd.GeoDataFrame.from_features(chunk, crs=crs)
+            if gdf.crs is not None:
+                gdf = gdf.to_crs(4326)
+            yield normalize_frame(gdf, columns, defaults={"country": "US"}, geoms=gdf.geometry.values)
+
+
+def copy_parcels(db: Session, frame: pd.DataFrame) -> int:
+    if frame.empty:
+        return 0
+    buf = io.StringIO()
+    frame[list(COPY_COLUMNS)].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(COPY_SQL, buf)
+    finally:
+        cursor.close()
+    return len(frame)
+
+
+def job_kind(filename: str) -> str | None:
+    return JOB_KINDS.get(os.path.splitext(filename.lower())[1])
+
+
+def store_upload(db: Session, fileobj, filename: str, kind: str, batch_size: int = BATCH_SIZE) -> models.IngestJob:
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    path = os.path.join(INGEST_DIR, uuid.uuid4().hex + os.path.splitext(filename)[1].lower())
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    job = models.IngestJob(kind=kind, filename=filename[:256], path=path, status="queued", batch_size=batch_size, chunks_done=0, rows_done=0, geoms_dropped=0, seconds=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def job_batches(job: models.IngestJob) -> Iterator[pd.DataFrame]:
+    if job.kind == "csv":
+        with open(job.path, "rb") as f:
+            yield from csv_batches(f, job.batch_size)
+    elif job.kind == "xlsx":
+        with open(job.path, "rb") as f:
+            yield from xlsx_batches(f, job.filename, job.batch_size)
+    else:
+        raise ValueError(f"{job.kind} jobs load per layer")
+
+
+def _extract(job: models.IngestJob) -> str:
+    directory = job.path + ".d"
+    if not os.path.isdir(directory):
+        with zipfile.ZipFile(job.path) as z:
+            z.extractall(directory + ".tmp")
+        os.replace(directory + ".tmp", directory)
+    return directory
+
+
+def prepare_layers(db: Session, job: models.IngestJob) -> list[int]:
+    # one checkpoint row per layer, in a fixed order so positions stay stable across resumes;
+    # returns the positions still to load
+    L = models.IngestJobLayer
+    known = dict(db.execute(select(L.position, L.status).where(L.job_id == job.id)).all())
+    if not known:
+        layers = archive_layers(_extract(job))
+        if not layers:
+            raise ValueError("No shapefile found in ZIP")
+        db.add_all(L(job_id=job.id, position=i, path=path, layer=layer, status="queued", chunks_done=0, rows_done=0) for i, (path, layer) in enumerate(layers))
+        db.commit()
+        known = {i: "queued" for i in range(len(layers))}
+    return sorted(p for p, status in known.items() if status != "done")
+
+
+def _cleanup(job: models.IngestJob) -> None:
+    shutil.rmtree(job.path + ".d", ignore_errors=True)
+    try:
+        os.remove(job.path)
+    except OSError:
+        pass
+
+
+def _fail(db: Session, job: models.IngestJob, e: Exception) -> None:
+    db.rollback()
+    job.status = "failed"
+    job.error = str(e)[:2000]
+    job.finished_at = func.now()
+    db.commit()
+
+
+def run_job(db: Session, job_id: int) -> models.IngestJob | None:
+    # CSV/XLSX jobs load here; shapefile jobs only prepare their layers and stay "running" until
+    # every run_layer has finished
+    job = db.get(models.IngestJob, job_id)
+    if job is None or job.status == "done":
+        return job
+    job.status = "running"
+    job.error = None
+    if job.started_at is None:
+        job.started_at = func.now()
+    db.commit()
+    if job.kind == "shapefile":
+        try:
+            prepare_layers(db, job)
+        except Exception as e:
+            _fail(db, job, e)
+            raise
+        return job
+    last = time.perf_counter()
+    try:
+        for index, frame in enumerate(job_batches(job)):
+            if index < job.chunks_done:
+                # already committed before a previous worker stopped
+                last = time.perf_counter()
+                continue
+            rows = copy_parcels(db, frame)
+            now = time.perf_counter()
+            job.chunks_done = index + 1
+            job.rows_done = (job.rows_done or 0) + rows
+            job.geoms_dropped = (job.geoms_dropped or 0) + int(frame["geom_dropped"].sum())
+            job.seconds = float(job.seconds or 0) + (now - last)
+            last = now
+            # the chunk's rows and its checkpoint commit together
+            db.commit()
+            tiles.invalidate_all()
+    except Exception as e:
+        _fail(db, job, e)
+        raise
+    job.status = "done"
+    job.finished_at = func.now()
+    db.commit()
+    _cleanup(job)
+    return job
+
+
+def run_layer(db: Session, job_id: int, position: int) -> models.IngestJobLayer | None:
+    J, L = models.IngestJob, models.IngestJobLayer
+    job = db.get(J, job_id)
+    row = db.execute(select(L).where(L.job_id == job_id, L.position == position)).scalar_one_or_none()
+    if job is None or row is None or row.status == "done":
+        return row
+    row.status = "running"
+    row.error = None
+    db.commit()
+    try:
+        for index, frame in enumerate(layer_batches(row.path, row.layer, job.batch_size)):
+            if index < row.chunks_done:
+                continue
+            rows = copy_parcels(db, frame)
+            row.chunks_done = index + 1
+            row.rows_done = (row.rows_done or 0) + rows
+            # job totals are incremented in SQL, since sibling layers update them concurrently
+            dropped = int(frame["geom_dropped"].sum())
+            db.execute(update(J).where(J.id == job_id).values(
+                chunks_done=J.chunks_done + 1, rows_done=J.rows_done + rows, geoms_dropped=J.geoms_dropped + dropped,
+            ))
+            db.commit()
+            tiles.invalidate_all()
+    except Exception as e:
+        db.rollback()
+        row.status = "failed"
+        row.error = str(e)[:2000]
+        name = os.path.basename(row.path) + (f":{row.layer}" if row.layer else "")
+        db.execute(update(J).where(J.id == job_id).values(status="failed", error=f"{name}: {e}"[:2000], finished_at=func.now()))
+        db.commit()
+        raise
+    row.status = "done"
+    db.commit()
+    # each layer checks after committing its own status, so whichever finishes last closes the job
+    finished = db.execute(
+        update(J)
+        .where(J.id == job_id, J.status == "running", ~exists().where(L.job_id == job_id, L.status != "done"))
+        .values(status="done", finished_at=func.now(), seconds=func.extract("epoch", func.now() - J.started_at))
+        .returning(J.id)
+    ).first()
+    db.commit()
+    if finished:
+        _cleanup(job)
+    return row
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import re
+import time
+from decimal import Decimal
+from email.message import EmailMessage
+import aiosmtplib
+from sqlalchemy import and_, exists, insert
+from .db import SessionLocal, iter_keyset
+from . import models
+from .ratelimit import TokenBucket
+from .security_encryption import decrypt_many
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_FROM = os.getenv("SMTP_FROM")
+# off for local sinks that do not speak TLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_RATE_PER_SEC = float(os.getenv("SMTP_RATE_PER_SEC", "10"))
+CAMPAIGN_BATCH_SIZE = int(os.getenv("CAMPAIGN_BATCH_SIZE", "1000"))
+
+_FIELD_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+_P = models.Parcel
+_O = models.Owner
+RECIPIENT_COLUMNS = (
+    _P.id, _O.email, _O.name, _P.owner_name, _P.parcel_id, _P.apn, _P.address,
+    _P.county, _P.state, _P.acreage, _P.offer_min, _P.offer_max,
+)
+TEMPLATE_FIELDS = (
+    "parcel_pk", "email", "name", "owner_name", "parcel_id", "apn", "address",
+    "county", "state", "acreage", "offer_min", "offer_max",
+)
+
+
+def configured() -> bool:
+    return bool(SMTP_HOST and SMTP_FROM)
+
+
+def _format(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    return str(value)
+
+
+def render(template: str, context: dict) -> str:
+    # {{field}} placeholders; unknown or empty fields render as ""
+    return _FIELD_RE.sub(lambda m: _format(context.get(m.group(1))), template)
+
+
+def build_message(to: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = SMTP_FROM
+    msg["To"] = to
+    msg.set_content(body)
+    return msg
+
+
+def _client() -> aiosmtplib.SMTP:
+    return aiosmtplib.SMTP(
+        hostname=SMTP_HOST,
+        port=SMTP_PORT,
+        start_tls=SMTP_STARTTLS,
+        username=SMTP_USER or None,
+        password=SMTP_PASS or None,
+        timeout=SMTP_TIMEOUT,
+    )
+
+
+async def _sender(queue: asyncio.Queue, bucket: TokenBucket, results: list):
+    # one persistent connection per sender; reconnects once when the server drops it
+    client = None
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            parcel_pk, msg = item
+            await bucket.acquire()
+            for attempt in (0, 1):
+                try:
+                    if client is None or not client.is_connected:
+                        client = _client()
+                        await client.connect()
+                    await client.send_message(msg)
+                    results.append((parcel_pk, "sent", None))
+                    break
+                except aiosmtplib.SMTPServerDisconnected as e:
+                    client = None
+                    if attempt:
+                        results.append((parcel_pk, "failed", str(e)))
+                except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused) as e:
+                    # the server rejected this message; the connection is still usable
+                    results.append((parcel_pk, "failed", str(e)))
+                    break
+                except Exception as e:
+                    if client is not None:
+                        client.close()
+                    client = None
+                    results.append((parcel_pk, "failed", str(e)))
+                    break
+    finally:
+        if client is not None and client.is_connected:
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+
+
+def _recipients(db, campaign_id: int, resend: bool):
+    criteria = [_P.campaign_id == campaign_id, _O.id == _P.owner_id, _O.email.isnot(None)]
+    if not resend:
+        I = models.Interaction
+        criteria.append(~exists().where(and_(
+            I.parcel_id == _P.id, I.campaign_id == campaign_id, I.channel == "email", I.status == "sent",
+        )))
+    return iter_keyset(db, RECIPIENT_COLUMNS, CAMPAIGN_BATCH_SIZE, *criteria)
+
+
+def _record(db, campaign_id: int, subject: str, results: list):
+    if not results:
+        return
+    db.execute(insert(models.Interaction), [
+        {
+            "parcel_id": parcel_pk,
+            "campaign_id": campaign_id,
+            "channel": "email",
+            "direction": "out",
+            "status": status,
+            "notes": f"Subject: {subject}" + (f"\nError: {error}" if error else ""),
+        }
+        for parcel_pk, status, error in results
+    ])
+    db.commit()
+
+
+async def _send_campaign(campaign_id: int, subject: str, body: str, resend: bool, concurrency: int, rate: float) -> dict:
+    stats = {"campaign_id": campaign_id, "sent": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    bucket = TokenBucket(rate, capacity=concurrency)
+    results: list = []
+    senders = [asyncio.create_task(_sender(queue, bucket, results)) for _ in range(concurrency)]
+
+    async def flush():
+        batch = results[:]
+        del results[: len(batch)]
+        await asyncio.to_thread(_record, db, campaign_id, subject, batch)
+        for _, status, _ in batch:
+            stats[status] += 1
+
+    db = SessionLocal()
+    try:
+        chunks = _recipients(db, campaign_id, resend)
+        while (rows := await asyncio.to_thread(next, chunks, None)) is not None:
+            emails = decrypt_many(row[1] for row in rows)
+            for row, email in zip(rows, emails):
+                if not email:
+                    stats["skipped"] += 1
+                    continue
+                context = dict(zip(TEMPLATE_FIELDS, row))
+                context["email"] = email
+                msg = build_message(email, render(subject, context), render(body, context))
+                await queue.put((row[0], msg))
+            # interactions for messages sent so far are bulk-inserted once per chunk
+            await flush()
+        for _ in senders:
+            await queue.put(None)
+        await asyncio.gather(*senders)
+        await flush()
+    finally:
+        for task in senders:
+            task.cancel()
+        db.close()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["per_sec"] = round(stats["sent"] / stats["seconds"], 1) if stats["seconds"] else None
+    return stats
+
+
+def send_campaign(campaign_id: int, subject: str, body: str, resend: bool = False, concurrency: int | None = None, rate: float | None = None) -> dict:
+    return asyncio.run(_send_campaign(
+        campaign_id, subject, body, resend,
+        concurrency or SMTP_POOL_SIZE,
+        SMTP_RATE_PER_SEC if rate is None else rate,
+    ))
@@ -11,7 +11,9 @@ from .routers import auctions as auctions_router
 from .routers import esign as esign_router
 from .routers import dialer as dialer_router
 from .routers import enrichment as enrichment_router
+from .routers import exports as exports_router
 from .middleware import AuditMiddleware
+from .geocoding import close_shared_client
 
 app = FastAPI(title="Land Flipping Automation API")
 
@@ -26,6 +28,10 @@ app.add_middleware(AuditMiddleware)
 
 Base.metadata.create_all(bind=engine)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_shared_client()
+
 app.include_router(health.router)
 app.include_router(auth.router)
 app.include_router(parcels.router)
@@ -39,3 +45,4 @@ app.include_router(auctions_router.router)
 app.include_router(esign_router.router)
 app.include_router(dialer_router.router)
 app.include_router(enrichment_router.router)
+app.include_router(exports_router.router)
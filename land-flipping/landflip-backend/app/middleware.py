@@ -1,26 +1,154 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from .db import SessionLocal
+import asyncio
+import datetime as dt
+import logging
+import os
+from sqlalchemy import insert
+from .db import engine
 from . import models
 
-class AuditMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response: Response = await call_next(request)
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1.0"))
+AUDIT_DRAIN_SECONDS = float(os.getenv("AUDIT_DRAIN_SECONDS", "10"))
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditWriter:
+    # requests only enqueue; a single background task writes multi-row INSERTs off the event loop
+    def __init__(self, maxsize: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = None
+        self.task = None
+        self._loop = None
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.queue = asyncio.Queue(self.maxsize)
+            self.task = None
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self._run())
+
+    def put(self, record: dict):
+        self.start()
+        try:
+            self.queue.put_nowait(record)
+            self.queued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def stop(self):
+        if self.task is None or self.task.done():
+            return
+        await self.queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self.task, AUDIT_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            log.warning("audit writer did not drain within %ss", AUDIT_DRAIN_SECONDS)
+        self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "pending": self.queue.qsize() if self.queue is not None else 0,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
         try:
-            db = SessionLocal()
-            user_id = None
-            auth = request.headers.get("authorization")
-            if auth and auth.lower().startswith("bearer "):
-                # lightweight parse; detailed user resolution done elsewhere
-                user_id = None
-            db.add(models.AuditLog(method=request.method, path=str(request.url.path), status_code=response.status_code, user_id=user_id))
-            db.commit()
+            await asyncio.to_thread(self._insert, batch)
+            self.written += len(batch)
+            self.batches += 1
         except Exception:
-            pass
+            self.failed += len(batch)
+            log.exception("failed to write %d audit records", len(batch))
+
+    @staticmethod
+    def _insert(batch: list):
+        with engine.begin() as conn:
+            conn.execute(insert(models.AuditLog), batch)
+
+
+audit_writer = AuditWriter()
+
+
+class AuditMiddleware:
+    def __init__(self, app, writer: AuditWriter = audit_writer):
+        self.app = app
+        self.writer = writer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            async def lifespan_receive():
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    self.writer.start()
+                elif message["type"] == "lifespan.shutdown":
+                    await self.writer.stop()
+                return message
+
+            await self.app(scope, lifespan_receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def audit_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, audit_send)
         finally:
-            try:
-                db.close()
-            except Exception:
-                pass
-        return response
+            # user resolution is done by the routes; the log records the request itself
+            self.writer.put({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status_code": status_code,
+                "user_id": None,
+                "created_at": dt.datetime.now(dt.timezone.utc),
+            })
@@ -1,10 +1,28 @@
 from __future__ import annotations
+import datetime as dt
+import glob
+import json
 import os
+import threading
+import time
+import zlib
 import joblib
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sqlalchemy import Integer, case, cast, func
 
 MODEL_PATH = os.getenv("MODEL_PATH", "/app/model.pkl")
+# versioned artifacts live here; MODEL_PATH is a symlink to the active one
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(MODEL_PATH) or ".", "models"))
+ESTIMATORS = {
+    "gbr": lambda: GradientBoostingRegressor(random_state=42),
+    # histogram-based, multi-threaded via OpenMP
+    "hist": lambda: HistGradientBoostingRegressor(random_state=42),
+}
+# bump when the feature layout or encoding changes; stored features are rebuilt
+ENCODING_VERSION = 2
+N_FEATURES = 3
 
 
 def heuristic_score(acreage: float | None, county: str | None, delinquency_years: float | None = None) -> int:
@@ -23,41 +41,142 @@ def heuristic_score(acreage: float | None, county: str | None, delinquency_years
     return max(0, min(100, score))
 
 
+def heuristic_score_expr(acreage, county, delinquency_years):
+    # SQL mirror of heuristic_score; the two must stay in step
+    score = (
+        50
+        + case((acreage >= 40, 20), (acreage >= 10, 10), (acreage != 0, 5), else_=0)
+        + case((county != "", 5), else_=0)
+        + case((delinquency_years != 0, func.least(func.trunc(delinquency_years * 3), 15)), else_=0)
+    )
+    return cast(func.greatest(0, func.least(100, score)), Integer)
+
+
+def _floats(values, default: float = 0.0) -> np.ndarray:
+    return np.array([float(v) if v is not None else default for v in values], dtype=float)
+
+
+def encode_category(value: str | None) -> float:
+    # crc32 rather than hash(): str hashes are salted per process
+    if not value:
+        return 0.0
+    return (zlib.crc32(value.strip().lower().encode()) % 1000) / 1000.0
+
+
+def _encode(values) -> np.ndarray:
+    # encode each distinct value once rather than once per row
+    uniq, inverse = np.unique(np.array([v or "" for v in values], dtype=object), return_inverse=True)
+    codes = np.array([encode_category(u) for u in uniq], dtype=float)
+    return codes[inverse.reshape(-1)]
+
+
+def features_matrix(acreage, counties, states) -> np.ndarray:
+    return np.column_stack([_floats(acreage), _encode(counties), _encode(states)])
+
+
 def features_from_parcel(parcel) -> np.ndarray:
-    acreage = float(parcel.acreage) if parcel.acreage is not None else 0.0
-    county_hash = (hash(parcel.county or "") % 1000) / 1000.0
-    state_hash = (hash(parcel.state or "") % 1000) / 1000.0
-    return np.array([acreage, county_hash, state_hash], dtype=float)
-
-
-def train_model(parcels) -> str:
-    X = []
-    y = []
-    for p in parcels:
-        X.append(features_from_parcel(p))
-        # pseudo-label valuation as acreage * constant if no valuation
-        target = float(p.valuation) if p.valuation is not None else (float(p.acreage or 0) * 2500.0)
-        y.append(target)
-    if not X:
+    return features_matrix([parcel.acreage], [parcel.county], [parcel.state])[0]
+
+
+def training_targets(valuations, acreage) -> np.ndarray:
+    # pseudo-label valuation as acreage * constant if no valuation
+    return np.array([float(v) if v is not None else float(a or 0) * 2500.0 for v, a in zip(valuations, acreage)])
+
+
+def _model_file(version: str) -> str:
+    return os.path.join(MODEL_DIR, f"model-{version}.pkl")
+
+
+def train_model(X: np.ndarray, y: np.ndarray, estimator: str = "gbr", activate: bool = True) -> dict:
+    if len(X) == 0:
         raise ValueError("No data to train")
-    X = np.vstack(X)
-    y = np.array(y)
-    model = GradientBoostingRegressor(random_state=42)
-    model.fit(X, y)
-    joblib.dump(model, MODEL_PATH)
-    return MODEL_PATH
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator: {estimator}")
+    order = np.random.default_rng(42).permutation(len(X))
+    n_test = len(X) // 5 if len(X) >= 10 else 0
+    test, train = order[:n_test], order[n_test:]
+    model = ESTIMATORS[estimator]()
+    started = time.perf_counter()
+    model.fit(X[train], y[train])
+    train_seconds = time.perf_counter() - started
+    version = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    meta = {
+        "version": version,
+        "estimator": estimator,
+        "created_at": dt.datetime.utcnow().isoformat() + "Z",
+        "train_seconds": round(train_seconds, 3),
+        "n_train": int(len(train)),
+        "n_test": int(n_test),
+        "r2": None,
+        "mae": None,
+    }
+    if n_test:
+        pred = model.predict(X[test])
+        meta["r2"] = float(r2_score(y[test], pred))
+        meta["mae"] = float(mean_absolute_error(y[test], pred))
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = _model_file(version)
+    joblib.dump(model, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(MODEL_DIR, f"model-{version}.json"), "w") as fh:
+        json.dump(meta, fh)
+    if activate:
+        activate_model(version)
+    return meta
+
+
+def activate_model(version: str) -> None:
+    path = _model_file(version)
+    if not os.path.exists(path):
+        raise FileNotFoundError(version)
+    # swap the symlink with a rename so readers see either the old or the new model
+    tmp = f"{MODEL_PATH}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(os.path.abspath(path), tmp)
+    os.replace(tmp, MODEL_PATH)
+
+
+def list_models() -> list[dict]:
+    active = os.path.realpath(MODEL_PATH)
+    models = []
+    for meta_path in sorted(glob.glob(os.path.join(MODEL_DIR, "model-*.json")), reverse=True):
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        meta["active"] = os.path.realpath(_model_file(meta["version"])) == active
+        models.append(meta)
+    return models
+
+
+_model_lock = threading.Lock()
+_model_cache: dict = {"key": None, "model": None}
 
 
 def load_model():
-    if not os.path.exists(MODEL_PATH):
+    # cached per process; reloaded when MODEL_PATH points at a different artifact
+    path = os.path.realpath(MODEL_PATH)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
         return None
-    return joblib.load(MODEL_PATH)
+    key = (path, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _model_lock:
+        if _model_cache["key"] != key:
+            _model_cache["model"] = joblib.load(path)
+            _model_cache["key"] = key
+        return _model_cache["model"]
 
 
-def estimate_value(parcel) -> float:
+def predict_values(X: np.ndarray) -> np.ndarray:
     model = load_model()
-    if not model:
-        return float(parcel.acreage or 0) * 2500.0
-    x = features_from_parcel(parcel).reshape(1, -1)
-    pred = float(model.predict(x)[0])
-    return pred
+    if model is None:
+        return np.asarray(X[:, 0], dtype=float) * 2500.0
+    return model.predict(X)
+
+
+def estimate_values(acreage, counties, states) -> np.ndarray:
+    return predict_values(features_matrix(acreage, counties, states))
+
+
+def estimate_value(parcel) -> float:
+    return float(estimate_values([parcel.acreage], [parcel.county], [parcel.state])[0])
@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Numeric, Text, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, Float, Text, ForeignKey, DateTime, Index, UniqueConstraint, DDL, event, func, literal_column, text
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from .db import Base
 
+def apn_norm_sql(column):
+    # SQL twin of apn.normalize_apn; the functional indexes below are built on exactly this expression
+    # literal arguments so queries render the same text as the index, whatever the driver's binding style
+    return func.regexp_replace(func.upper(column), literal_column("'[^A-Z0-9]'"), literal_column("''"), literal_column("'g'"))
+
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -18,11 +25,20 @@ class Owner(Base):
     name = Column(String(256), index=True)
     email = Column(String(256))
     phone = Column(String(64))
+    email_bidx = Column(String(32), index=True)
+    phone_bidx = Column(String(32), index=True)
+    # entity resolution: token-sorted normalized name, and the "STATE:token" block it is compared within
+    name_key = Column(String(256))
+    block_key = Column(String(160))
     country = Column(String(2))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     parcels = relationship("Parcel", back_populates="owner")
 
+    __table_args__ = (
+        Index("ix_owners_block_key_id", "block_key", "id"),
+    )
+
 class Campaign(Base):
     __tablename__ = "campaigns"
     id = Column(Integer, primary_key=True)
@@ -41,11 +57,12 @@ class Parcel(Base):
     parcel_id = Column(String(128), index=True)
     apn = Column(String(128), index=True)
     owner_name = Column(String(256), index=True)
-    owner_id = Column(Integer, ForeignKey("owners.id"), nullable=True)
+    owner_id = Column(Integer, ForeignKey("owners.id"), nullable=True, index=True)
     county = Column(String(128), index=True)
     state = Column(String(64), index=True)
     country = Column(String(2), index=True)
     acreage = Column(Numeric)
+    delinquency_years = Column(Numeric)
     address = Column(Text)
     status = Column(String(64), index=True, default="lead")
     score = Column(Integer)
@@ -53,13 +70,28 @@ class Parcel(Base):
     offer_min = Column(Numeric)
     offer_max = Column(Numeric)
     campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=True)
-    geom = Column(Geometry("POLYGON", srid=4326))
+    geom = Column(Geometry("POLYGON", srid=4326, spatial_index=False))
+    # geocoded from address; parcels without a polygon still get a point
+    location = Column(Geometry("POINT", srid=4326, spatial_index=False))
+    auction_flagged_at = Column(DateTime(timezone=True), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
 
     owner = relationship("Owner", back_populates="parcels")
     campaign = relationship("Campaign", back_populates="parcels")
     interactions = relationship("Interaction", back_populates="parcel")
 
+    __table_args__ = (
+        Index("idx_parcels_geom", "geom", postgresql_using="gist"),
+        Index("idx_parcels_location", "location", postgresql_using="gist"),
+        # trigram indexes serve fuzzy search and leading-wildcard ILIKE filters
+        Index("ix_parcels_owner_name_trgm", "owner_name", postgresql_using="gin", postgresql_ops={"owner_name": "gin_trgm_ops"}),
+        Index("ix_parcels_county_trgm", "county", postgresql_using="gin", postgresql_ops={"county": "gin_trgm_ops"}),
+        Index("ix_parcels_address_trgm", "address", postgresql_using="gin", postgresql_ops={"address": "gin_trgm_ops"}),
+        Index("ix_parcels_apn_norm", apn_norm_sql(apn)),
+        Index("ix_parcels_parcel_id_norm", apn_norm_sql(parcel_id)),
+    )
+
 class Interaction(Base):
     __tablename__ = "interactions"
     id = Column(Integer, primary_key=True)
@@ -74,6 +106,10 @@ class Interaction(Base):
     parcel = relationship("Parcel", back_populates="interactions")
     campaign = relationship("Campaign", back_populates="interactions")
 
+    __table_args__ = (
+        Index("ix_interactions_parcel_id_id", "parcel_id", "id"),
+    )
+
 class AuctionSource(Base):
     __tablename__ = "auction_sources"
     id = Column(Integer, primary_key=True)
@@ -82,6 +118,15 @@ class AuctionSource(Base):
     county = Column(String(128))
     state = Column(String(64))
     country = Column(String(2))
+    # conditional-GET validators and a hash of the last body, so unchanged pages are skipped
+    etag = Column(String(256))
+    last_modified = Column(String(64))
+    content_hash = Column(String(64))
+    last_crawled_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    # beat re-crawls a source once next_crawl_at passes; a null/0 interval means manual runs only
+    crawl_interval_minutes = Column(Integer, default=1440)
+    next_crawl_at = Column(DateTime(timezone=True), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class AuctionEvent(Base):
@@ -89,10 +134,75 @@ class AuctionEvent(Base):
     id = Column(Integer, primary_key=True)
     source_id = Column(Integer, ForeignKey("auction_sources.id"))
     parcel_id_text = Column(String(256))
+    apn_norm = Column(String(256), index=True)
+    parcel_id = Column(Integer, ForeignKey("parcels.id"), nullable=True, index=True)
+    match_checked_at = Column(DateTime(timezone=True))
     status = Column(String(64))
     raw = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        UniqueConstraint("source_id", "parcel_id_text", name="uq_auction_events_source_parcel"),
+    )
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16))
+    filename = Column(String(256))
+    path = Column(Text)
+    status = Column(String(32), index=True, default="queued")
+    batch_size = Column(Integer)
+    chunks_done = Column(Integer, default=0)
+    rows_done = Column(Integer, default=0)
+    # rows loaded without their geometry because it was not a (single-part) polygon
+    geoms_dropped = Column(Integer, default=0)
+    seconds = Column(Numeric, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    @property
+    def rows_per_sec(self):
+        seconds = float(self.seconds or 0)
+        return round((self.rows_done or 0) / seconds, 1) if seconds > 0 else None
+
+class IngestJobLayer(Base):
+    # shapefile/GeoPackage jobs load each layer as its own task, resuming from the layer's checkpoint
+    __tablename__ = "ingest_job_layers"
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("ingest_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    path = Column(Text)
+    layer = Column(String(256))
+    status = Column(String(32), default="queued")
+    chunks_done = Column(Integer, default=0)
+    rows_done = Column(Integer, default=0)
+    error = Column(Text)
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "position", name="uq_ingest_job_layers_job_position"),
+    )
+
+class EnrichmentCache(Base):
+    __tablename__ = "enrichment_cache"
+    id = Column(Integer, primary_key=True)
+    key = Column(Text, unique=True, nullable=False)
+    phone = Column(String(256))
+    email = Column(String(512))
+    raw_hits = Column(Integer, default=0)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    id = Column(Integer, primary_key=True)
+    # geocoding.normalize_address of the query; a null lat/lon records that the provider had no match
+    key = Column(Text, unique=True, nullable=False)
+    lat = Column(Float)
+    lon = Column(Float)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True)
@@ -101,3 +211,98 @@ class AuditLog(Base):
     path = Column(Text)
     status_code = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CampaignMetric(Base):
+    # per-campaign row counts by parcel/interaction status, maintained by the triggers below
+    __tablename__ = "campaign_metrics"
+    campaign_id = Column(Integer, primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    # '' stands for a null status, which a primary key column cannot hold
+    status = Column(String(64), primary_key=True, default="")
+    total = Column(BigInteger, nullable=False, default=0)
+
+# statement-level triggers: each INSERT/UPDATE/DELETE (COPY and bulk updates included) folds its
+# transition tables into one grouped upsert. An UPDATE that leaves campaign/status alone nets to zero
+# and writes nothing; rows are upserted in key order so concurrent writers lock them consistently.
+_CAMPAIGN_METRICS_FUNCTION = """
+CREATE OR REPLACE FUNCTION campaign_metrics_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO campaign_metrics (campaign_id, kind, status, total)
+        SELECT campaign_id, TG_ARGV[0], coalesce(status, ''), count(*) FROM new_rows
+        WHERE campaign_id IS NOT NULL GROUP BY 1, 3 ORDER BY 1, 3
+        ON CONFLICT (campaign_id, kind, status) DO UPDATE SET total = campaign_metrics.total + EXCLUDED.total;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO campaign_metrics (campaign_id, kind, status, total)
+        SELECT campaign_id, TG_ARGV[0], coalesce(status, ''), -count(*) FROM old_rows
+        WHERE campaign_id IS NOT NULL GROUP BY 1, 3 ORDER BY 1, 3
+        ON CONFLICT (campaign_id, kind, status) DO UPDATE SET total = campaign_metrics.total + EXCLUDED.total;
+    ELSE
+        -- row-level UPDATE: only rows whose campaign_id or status changed get here
+        INSERT INTO campaign_metrics (campaign_id, kind, status, total)
+        SELECT campaign_id, TG_ARGV[0], status, sum(delta) FROM (VALUES
+            (OLD.campaign_id, coalesce(OLD.status, ''), -1),
+            (NEW.campaign_id, coalesce(NEW.status, ''), 1)
+        ) d (campaign_id, status, delta)
+        WHERE campaign_id IS NOT NULL GROUP BY 1, 3 HAVING sum(delta) <> 0 ORDER BY 1, 3
+        ON CONFLICT (campaign_id, kind, status) DO UPDATE SET total = campaign_metrics.total + EXCLUDED.total;
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+# a trigger with transition tables can only cover one event, and cannot have a column list. So
+# INSERT and DELETE are per statement, while UPDATE is per row, restricted to the two columns the
+# rollup counts: score, valuation, geocoding and owner updates never fire it
+_CAMPAIGN_METRICS_TRIGGERS = {
+    "insert": "AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT",
+    "delete": "AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT",
+    "update": (
+        "AFTER UPDATE OF campaign_id, status ON {table} FOR EACH ROW "
+        "WHEN (OLD.campaign_id IS DISTINCT FROM NEW.campaign_id OR OLD.status IS DISTINCT FROM NEW.status)"
+    ),
+}
+
+# creates only missing triggers, so a restart takes no lock on the tables
+_CAMPAIGN_METRICS_INSTALL = """
+DO $$
+BEGIN
+{body}
+END $$
+"""
+_CREATE_TRIGGER = """    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = '{table}'::regclass AND tgname = '{name}') THEN
+        BEGIN
+            CREATE TRIGGER {name} {spec} EXECUTE FUNCTION campaign_metrics_apply('{kind}');
+        EXCEPTION WHEN duplicate_object OR unique_violation THEN
+            NULL;  -- another API process installed it first
+        END;
+    END IF;"""
+
+# recounts from scratch; the lock keeps writes out between the recount and commit
+CAMPAIGN_METRICS_REBUILD = """
+LOCK TABLE parcels, interactions IN SHARE MODE;
+DELETE FROM campaign_metrics;
+INSERT INTO campaign_metrics (campaign_id, kind, status, total)
+SELECT campaign_id, 'parcel', coalesce(status, ''), count(*) FROM parcels WHERE campaign_id IS NOT NULL GROUP BY 1, 3
+UNION ALL
+SELECT campaign_id, 'interaction', coalesce(status, ''), count(*) FROM interactions WHERE campaign_id IS NOT NULL GROUP BY 1, 3;
+"""
+
+@event.listens_for(CampaignMetric.__table__, "after_create")
+def _campaign_metrics_created(target, connection, **kw):
+    connection.info["campaign_metrics_created"] = True
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_campaign_metrics(target, connection, **kw):
+    # runs once every table exists; the backfill only when the rollup table was just created
+    created = connection.info.pop("campaign_metrics_created", False)
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(text(_CAMPAIGN_METRICS_FUNCTION))
+    body = []
+    for table, kind in (("parcels", "parcel"), ("interactions", "interaction")):
+        for event_name, spec in _CAMPAIGN_METRICS_TRIGGERS.items():
+            body.append(_CREATE_TRIGGER.format(table=table, name=f"{table}_metrics_{event_name}", spec=spec.format(table=table), kind=kind))
+    connection.execute(text(_CAMPAIGN_METRICS_INSTALL.format(body="\n".join(body))))
+    if created:
+        connection.execute(text(CAMPAIGN_METRICS_REBUILD))
@@ -0,0 +1,38 @@
+from __future__ import annotations
+import base64
+import json
+from typing import Any
+from fastapi import HTTPException
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str | None, *types: type) -> list | None:
+    # `types` gives the expected type of each value; a cursor is client input and must not reach SQL unchecked
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception:
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(values, types))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def paginate(q, column, cursor: str | None, limit: int) -> dict[str, Any]:
+    # keyset on a unique integer column, newest first: each page is one index range scan
+    last = decode_cursor(cursor, int)
+    if last is not None:
+        q = q.filter(column < last[0])
+    rows = q.order_by(column.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor([getattr(rows[limit - 1], column.key)]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import redis
+
+# where shared buckets keep their state; memory:// falls back to a bucket per process for local runs
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1"))
+
+# GCRA: the key holds the time (us) at which the bucket is next empty. Each call reserves one
+# token and returns how long the caller must wait for it; Redis' own clock keeps hosts consistent.
+_RESERVE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local interval = tonumber(ARGV[1])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local next_tat = tat + interval * tonumber(ARGV[3])
+redis.call('SET', KEYS[1], string.format('%.0f', next_tat), 'PX', math.ceil((next_tat - now) / 1000) + 1000)
+return math.max(0, math.ceil(next_tat - now - tonumber(ARGV[2])))
+"""
+
+
+class TokenBucket:
+    # async token bucket: `rate` tokens per second, bursting up to `capacity`. Callers reserve tokens
+    # under a thread lock and sleep off any deficit outside it, so one bucket can be shared across
+    # threads and event loops (the API loop and each asyncio.run in a worker)
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RedisTokenBucket:
+    # a TokenBucket whose state lives in Redis, so the API and every worker process draw from one budget
+    def __init__(self, url: str, key: str, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.key = key
+        self.client = redis.Redis.from_url(url)
+        self._reserve = self.client.register_script(_RESERVE)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        interval = 1_000_000 / self.rate
+        waited = self._reserve(keys=[self.key], args=[interval, interval * self.capacity, tokens])
+        return int(waited) / 1_000_000
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        # the blocking round trip stays off the event loop
+        wait = await asyncio.to_thread(self.reserve, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def shared_bucket(name: str, rate: float, capacity: float | None = None, url: str = RATE_LIMIT_URL):
+    if url.startswith(("redis://", "rediss://")):
+        return RedisTokenBucket(url, f"landflip:ratelimit:{name}", rate, capacity)
+    return TokenBucket(rate, capacity)
+
+
+class HostRateLimiter:
+    # one token bucket per URL host
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        await bucket.acquire()
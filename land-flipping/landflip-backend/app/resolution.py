@@ -0,0 +1,275 @@
+import itertools
+import os
+import re
+import time
+from collections import defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from . import models
+from .db import iter_keyset, bulk_update, bulk_remap
+
+# owners are matched on normalized, token-sorted name keys, so plain ratio == token_sort_ratio
+RESOLUTION_THRESHOLD = int(os.getenv("RESOLUTION_THRESHOLD", "92"))
+RESOLUTION_CHUNK_SIZE = int(os.getenv("RESOLUTION_CHUNK_SIZE", "20000"))
+# rows per cdist call; bounds each score matrix to _SLICE x candidates bytes
+_SLICE = 1000
+
+_NOISE = {"the", "of", "and", "etal", "et", "al", "etux", "ux", "trustee", "trustees", "ttee", "tr", "co"}
+_CANONICAL = {
+    "incorporated": "inc",
+    "corporation": "corp",
+    "company": "co",
+    "limited": "ltd",
+    "revocable": "rev",
+    "living": "liv",
+}
+
+
+def name_key(name: str | None) -> str:
+    s = (name or "").lower().replace(".", "").replace("&", " and ")
+    tokens = (_CANONICAL.get(t, t) for t in re.sub(r"[^\w\s]", " ", s).split())
+    return " ".join(sorted(t for t in tokens if t not in _NOISE))
+
+
+def block_key(key: str, state: str | None = None) -> str | None:
+    # state plus the longest name token (usually the surname or firm name); "" state means unknown
+    tokens = key.split()
+    if not tokens:
+        return None
+    return f"{(state or '').strip().upper()}:{max(tokens, key=lambda t: (len(t), t))}"
+
+
+def owner_keys(name: str | None, state: str | None = None) -> dict:
+    key = name_key(name)
+    return {"name_key": key, "block_key": block_key(key, state)}
+
+
+def _best(queries: list, choices: list) -> tuple[np.ndarray, np.ndarray]:
+    # best choice index and score per query, computed in slices so memory stays bounded
+    best_idx = np.full(len(queries), -1, dtype=np.int64)
+    best_score = np.zeros(len(queries), dtype=np.uint8)
+    for q0 in range(0, len(queries), _SLICE):
+        q = queries[q0:q0 + _SLICE]
+        for c0 in range(0, len(choices), _SLICE * 10):
+            scores = process.cdist(
+                q, choices[c0:c0 + _SLICE * 10],
+                scorer=fuzz.ratio, dtype=np.uint8, score_cutoff=RESOLUTION_THRESHOLD, workers=-1,
+            )
+            idx = scores.argmax(axis=1)
+            val = scores[np.arange(len(q)), idx]
+            better = val > best_score[q0:q0 + len(q)]
+            best_score[q0:q0 + len(q)][better] = val[better]
+            best_idx[q0:q0 + len(q)][better] = idx[better] + c0
+    return best_idx, best_score
+
+
+def _cluster(keys: list) -> np.ndarray:
+    # greedy leader clustering: each key joins the first earlier key it scores >= threshold against
+    leader = np.full(len(keys), -1, dtype=np.int64)
+    for s in range(0, len(keys), _SLICE):
+        scores = process.cdist(
+            keys[s:s + _SLICE], keys,
+            scorer=fuzz.ratio, dtype=np.uint8, score_cutoff=RESOLUTION_THRESHOLD, workers=-1,
+        )
+        for i in range(s, min(len(keys), s + _SLICE)):
+            if leader[i] == -1:
+                members = np.flatnonzero((scores[i - s] >= RESOLUTION_THRESHOLD) & (leader == -1))
+                leader[members] = i
+                leader[i] = i
+    return leader
+
+
+def _candidates(db, blocks) -> dict:
+    # existing owners per block, lowest id first; owners with no known state are candidates in every state
+    O = models.Owner
+    stateless = {b: ":" + b.split(":", 1)[1] for b in blocks}
+    names = sorted(set(stateless) | set(stateless.values()))
+    found = defaultdict(list)
+    for i in range(0, len(names), 1000):
+        rows = db.execute(
+            select(O.id, O.name_key, O.block_key).where(O.block_key.in_(names[i:i + 1000])).order_by(O.id)
+        ).all()
+        for oid, key, block in rows:
+            found[block].append((oid, key))
+    return {
+        b: sorted(found[b] + (found[s] if s != b else []))
+        for b, s in stateless.items()
+    }
+
+
+def _match(keys: list, candidates: list) -> list:
+    if not candidates:
+        return [None] * len(keys)
+    exact = {}
+    for oid, key in candidates:
+        exact.setdefault(key, oid)
+    out = [exact.get(k) for k in keys]
+    todo = sorted({k for k, o in zip(keys, out) if o is None})
+    if todo:
+        idx, score = _best(todo, [k for _, k in candidates])
+        fuzzy = {k: candidates[j][0] for k, j, s in zip(todo, idx, score) if j >= 0 and s >= RESOLUTION_THRESHOLD}
+        out = [o if o is not None else fuzzy.get(k) for k, o in zip(keys, out)]
+    return out
+
+
+def backfill_owner_keys(db, chunk_size: int = RESOLUTION_CHUNK_SIZE) -> int:
+    O, P = models.Owner, models.Parcel
+    q = (
+        select(O.id, O.name, func.min(P.state))
+        .outerjoin(P, P.owner_id == O.id)
+        .where(O.name_key.is_(None))
+        .group_by(O.id)
+        .order_by(O.id)
+        .limit(chunk_size)
+    )
+    done = 0
+    while True:
+        # every pass fills the keys it read, so the filter itself advances the scan
+        rows = db.execute(q).all()
+        if not rows:
+            return done
+        keys = [owner_keys(name, state) for _, name, state in rows]
+        ids = [r[0] for r in rows]
+        bulk_update(db, "owners", "name_key", ids, [k["name_key"] for k in keys])
+        bulk_update(db, "owners", "block_key", ids, [k["block_key"] for k in keys])
+        db.commit()
+        done += len(rows)
+
+
+def _owner_blocks(db, chunk_size: int):
+    # owners grouped by block, read in (block_key, id) keyset order; a block spanning pages is held back
+    O = models.Owner
+    cols = (O.id, O.block_key, O.name_key, O.email, O.phone, O.email_bidx, O.phone_bidx)
+    last = None
+    pending = []
+    while True:
+        q = select(*cols).where(O.block_key.isnot(None))
+        if last is not None:
+            q = q.where(tuple_(O.block_key, O.id) > last)
+        rows = db.execute(q.order_by(O.block_key, O.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        last = (rows[-1].block_key, rows[-1].id)
+        pending.extend(rows)
+        tail = pending[-1].block_key
+        complete = [r for r in pending if r.block_key != tail]
+        pending = [r for r in pending if r.block_key == tail]
+        for _, group in itertools.groupby(complete, key=lambda r: r.block_key):
+            yield list(group)
+    if pending:
+        yield pending
+
+
+def merge_owners(db, chunk_size: int = RESOLUTION_CHUNK_SIZE) -> int:
+    # collapses duplicate owners within a block onto the lowest id, keeping any contact data they carried
+    merged = 0
+    dups, canon, fills = [], [], []
+    for rows in _owner_blocks(db, chunk_size):
+        if len(rows) < 2:
+            continue
+        keys = sorted({r.name_key for r in rows})
+        leader = _cluster(keys)
+        cluster_of = {k: keys[leader[i]] for i, k in enumerate(keys)}
+        groups = defaultdict(list)
+        for r in rows:
+            groups[cluster_of[r.name_key]].append(r)
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            head, rest = members[0], members[1:]
+            fill = {}
+            for field in ("email", "phone"):
+                if getattr(head, field) is None:
+                    donor = next((m for m in rest if getattr(m, field) is not None), None)
+                    if donor is not None:
+                        fill[field] = getattr(donor, field)
+                        fill[field + "_bidx"] = getattr(donor, field + "_bidx")
+            if fill:
+                fills.append((head.id, fill))
+            dups.extend(m.id for m in rest)
+            canon.extend(head.id for _ in rest)
+        if len(dups) >= chunk_size:
+            merged += _apply_merge(db, dups, canon, fills)
+            dups, canon, fills = [], [], []
+    if dups:
+        merged += _apply_merge(db, dups, canon, fills)
+    return merged
+
+
+def _apply_merge(db, dups: list, canon: list, fills: list) -> int:
+    O = models.Owner
+    bulk_remap(db, "parcels", "owner_id", dups, canon)
+    for oid, fill in fills:
+        db.execute(update(O).where(O.id == oid).values(**fill))
+    db.execute(delete(O).where(O.id.in_(dups)))
+    db.commit()
+    return len(dups)
+
+
+def resolve_parcels(db, chunk_size: int = RESOLUTION_CHUNK_SIZE) -> dict:
+    # links parcels that only carry owner_name to an existing or newly created canonical owner
+    O, P = models.Owner, models.Parcel
+    stats = {"parcels": 0, "matched": 0, "created": 0}
+    for rows in iter_keyset(db, (P.id, P.owner_name, P.state), chunk_size, P.owner_id.is_(None), P.owner_name.isnot(None)):
+        keys = [name_key(name) for _, name, _ in rows]
+        by_block = defaultdict(list)
+        for i, (key, row) in enumerate(zip(keys, rows)):
+            block = block_key(key, row[2])
+            if block:
+                by_block[block].append(i)
+        candidates = _candidates(db, by_block)
+        owner_of = {}
+        new_owners = []
+        for block, idxs in by_block.items():
+            unmatched = defaultdict(list)
+            for i, oid in zip(idxs, _match([keys[i] for i in idxs], candidates[block])):
+                if oid is not None:
+                    owner_of[i] = oid
+                else:
+                    unmatched[keys[i]].append(i)
+            stats["matched"] += len(idxs) - sum(map(len, unmatched.values()))
+            if not unmatched:
+                continue
+            ukeys = list(unmatched)
+            groups = defaultdict(list)
+            for j, lead in enumerate(_cluster(ukeys)):
+                groups[lead].extend(unmatched[ukeys[j]])
+            for lead, members in groups.items():
+                new_owners.append(({"name": rows[members[0]][1][:256], "name_key": ukeys[lead], "block_key": block}, members))
+        if new_owners:
+            ids = db.execute(
+                insert(O).returning(O.id, sort_by_parameter_order=True), [values for values, _ in new_owners]
+            ).scalars().all()
+            for oid, (_, members) in zip(ids, new_owners):
+                for i in members:
+                    owner_of[i] = oid
+            stats["created"] += len(ids)
+        bulk_update(db, "parcels", "owner_id", [rows[i][0] for i in owner_of], list(owner_of.values()))
+        db.commit()
+        stats["parcels"] += len(owner_of)
+    return stats
+
+
+def resolve_parcel(db, parcel: models.Parcel):
+    key = name_key(parcel.owner_name)
+    block = block_key(key, parcel.state)
+    if not block:
+        return None
+    [oid] = _match([key], _candidates(db, [block])[block])
+    if oid is None:
+        owner = models.Owner(name=parcel.owner_name, name_key=key, block_key=block)
+        db.add(owner)
+        db.flush()
+        oid = owner.id
+    parcel.owner_id = oid
+    return oid
+
+
+def resolve_all(db, merge: bool = True) -> dict:
+    started = time.perf_counter()
+    stats = {"keyed": backfill_owner_keys(db)}
+    stats["merged"] = merge_owners(db) if merge else 0
+    stats.update(resolve_parcels(db))
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
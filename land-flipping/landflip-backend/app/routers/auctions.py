@@ -1,24 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-import requests
-from bs4 import BeautifulSoup
+from typing import List, Optional
 from ..db import get_db
-from .. import models
+from .. import models, schemas
+from ..pagination import paginate
+from ..crawler import crawl_source
+from ..tasks import crawl_auction_sources, match_auction_events
 
 router = APIRouter(prefix="/auctions", tags=["auctions"])
 
-@router.get("/sources")
-def list_sources(db: Session = Depends(get_db)):
-    return db.query(models.AuctionSource).order_by(models.AuctionSource.id.desc()).all()
+@router.get("/sources", response_model=schemas.Page[schemas.AuctionSourceOut])
+def list_sources(
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    return paginate(db.query(models.AuctionSource), models.AuctionSource.id, cursor, limit)
 
 @router.post("/sources")
-def add_source(name: str, url: str, county: str = "", state: str = "", country: str = "US", db: Session = Depends(get_db)):
-    s = models.AuctionSource(name=name, url=url, county=county, state=state, country=country)
+def add_source(
+    name: str,
+    url: str,
+    county: str = "",
+    state: str = "",
+    country: str = "US",
+    crawl_interval_minutes: int = Query(1440, ge=0),
+    db: Session = Depends(get_db),
+):
+    s = models.AuctionSource(
+        name=name, url=url, county=county, state=state, country=country, crawl_interval_minutes=crawl_interval_minutes
+    )
     db.add(s)
     db.commit()
     db.refresh(s)
     return s
 
+@router.patch("/sources/{source_id}", response_model=schemas.AuctionSourceOut)
+def set_source_interval(source_id: int, crawl_interval_minutes: int = Query(..., ge=0), db: Session = Depends(get_db)):
+    s = db.get(models.AuctionSource, source_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="Not found")
+    s.crawl_interval_minutes = crawl_interval_minutes
+    # due again on the next beat dispatch, which schedules it on the new interval
+    s.next_crawl_at = None
+    db.commit()
+    db.refresh(s)
+    return s
+
 @router.delete("/sources/{source_id}")
 def delete_source(source_id: int, db: Session = Depends(get_db)):
     s = db.get(models.AuctionSource, source_id)
@@ -28,23 +56,39 @@ def delete_source(source_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"deleted": source_id}
 
+@router.get("/matches", response_model=schemas.Page[schemas.AuctionEventOut])
+def list_matches(
+    db: Session = Depends(get_db),
+    source_id: Optional[int] = None,
+    parcel_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    E = models.AuctionEvent
+    q = db.query(E).filter(E.parcel_id.isnot(None))
+    if source_id is not None:
+        q = q.filter(E.source_id == source_id)
+    if parcel_id is not None:
+        q = q.filter(E.parcel_id == parcel_id)
+    return paginate(q, E.id, cursor, limit)
+
+@router.post("/match", status_code=202)
+def run_match(rematch: bool = False):
+    task = match_auction_events.delay(rematch)
+    return {"task_id": task.id}
+
+@router.post("/run", status_code=202)
+def run_sources(source_ids: Optional[List[int]] = Query(None)):
+    task = crawl_auction_sources.delay(source_ids)
+    return {"task_id": task.id}
+
 @router.post("/run/{source_id}")
 def run_source(source_id: int, db: Session = Depends(get_db)):
-    s = db.get(models.AuctionSource, source_id)
-    if not s:
+    if not db.get(models.AuctionSource, source_id):
         raise HTTPException(status_code=404, detail="Not found")
-    try:
-        r = requests.get(s.url, timeout=20, headers={"User-Agent": "landflip/1.0"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        text = soup.get_text(" ", strip=True)
-        # naive extract: look for "APN" or parcel-like tokens
-        events = 0
-        for token in set(text.split()):
-            if any(k in token.upper() for k in ["APN", "PARCEL", "PIN"]):
-                db.add(models.AuctionEvent(source_id=s.id, parcel_id_text=token[:256], status="found", raw=token))
-                events += 1
-        db.commit()
-        return {"events": events}
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Fetch failed: {e}")
+    res = crawl_source(db, source_id)
+    if res is None:
+        raise HTTPException(status_code=400, detail="Source has no URL")
+    if res["status"] == "failed":
+        raise HTTPException(status_code=502, detail=f"Fetch failed: {res.get('error')}")
+    return {"status": res["status"], "events": res["events"]}
@@ -1,31 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from ..db import get_db
+from ..deps import CurrentUser, get_current_user
 from .. import models, schemas
-from ..security import hash_password, verify_password, create_access_token
+from ..security import hash_password_async, verify_password_async, create_access_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _user_by_email(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def _save(db: Session, user: models.User):
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
 @router.post("/signup", response_model=schemas.UserOut)
-def signup(payload: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == payload.email).first()
+async def signup(payload: schemas.UserCreate, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(_user_by_email, db, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     user = models.User(
         email=payload.email,
         name=payload.name,
-        hashed_password=hash_password(payload.password),
+        hashed_password=await hash_password_async(payload.password),
         role="admin",
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    return await run_in_threadpool(_save, db, user)
 
 @router.post("/login", response_model=schemas.TokenResponse)
-def login(payload: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: schemas.UserLogin, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_user_by_email, db, payload.email)
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(subject=str(user.id))
     return {"access_token": token, "token_type": "bearer"}
+
+@router.get("/me", response_model=schemas.UserOut)
+def me(current: CurrentUser = Depends(get_current_user)):
+    if current.user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return current.user
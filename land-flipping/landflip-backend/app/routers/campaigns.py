@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import select, text
+from typing import List, Optional
 from ..db import get_db
 from .. import models, schemas
+from ..pagination import paginate
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
-@router.get("/", response_model=List[schemas.CampaignOut])
-def list_campaigns(db: Session = Depends(get_db)):
-    return db.query(models.Campaign).order_by(models.Campaign.id.desc()).all()
+@router.get("/", response_model=schemas.Page[schemas.CampaignOut])
+def list_campaigns(
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    return paginate(db.query(models.Campaign), models.Campaign.id, cursor, limit)
 
 @router.post("/", response_model=schemas.CampaignOut)
 def create_campaign(payload: schemas.CampaignCreate, db: Session = Depends(get_db)):
@@ -19,6 +24,36 @@ def create_campaign(payload: schemas.CampaignCreate, db: Session = Depends(get_d
     db.refresh(c)
     return c
 
+def _metrics(rows) -> dict:
+    # (campaign_id, kind, status, total) rollup rows -> the per-campaign metrics shape
+    out = {}
+    for campaign_id, kind, status, total in rows:
+        m = out.setdefault(campaign_id, {"parcels_total": 0, "parcels_by_status": {}, "interactions_by_status": {}})
+        if not total:
+            continue
+        status = status or None
+        if kind == "parcel":
+            m["parcels_total"] += total
+            m["parcels_by_status"][status] = total
+        else:
+            m["interactions_by_status"][status] = total
+    return out
+
+@router.get("/metrics")
+def all_campaign_metrics(campaign_ids: Optional[List[int]] = Query(None), db: Session = Depends(get_db)):
+    C, M = models.Campaign, models.CampaignMetric
+    q = select(C.id, M.kind, M.status, M.total).outerjoin(M, M.campaign_id == C.id).order_by(C.id)
+    if campaign_ids:
+        q = q.where(C.id.in_(campaign_ids))
+    return [{"campaign_id": cid, **m} for cid, m in _metrics(db.execute(q).all()).items()]
+
+@router.post("/metrics/rebuild")
+def rebuild_campaign_metrics(db: Session = Depends(get_db)):
+    # triggers do not see TRUNCATE or writes made with triggers disabled; this recounts everything
+    db.execute(text(models.CAMPAIGN_METRICS_REBUILD))
+    db.commit()
+    return {"rebuilt": True}
+
 @router.get("/{campaign_id}", response_model=schemas.CampaignOut)
 def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
     c = db.get(models.Campaign, campaign_id)
@@ -37,21 +72,6 @@ def delete_campaign(campaign_id: int, db: Session = Depends(get_db)):
 
 @router.get("/{campaign_id}/metrics")
 def campaign_metrics(campaign_id: int, db: Session = Depends(get_db)):
-    total = db.query(models.Parcel).filter(models.Parcel.campaign_id == campaign_id).count()
-    by_status = (
-        db.query(models.Parcel.status, func.count(models.Parcel.id))
-        .filter(models.Parcel.campaign_id == campaign_id)
-        .group_by(models.Parcel.status)
-        .all()
-    )
-    inter_stats = (
-        db.query(models.Interaction.status, func.count(models.Interaction.id))
-        .filter(models.Interaction.campaign_id == campaign_id)
-        .group_by(models.Interaction.status)
-        .all()
-    )
-    return {
-        "parcels_total": total,
-        "parcels_by_status": dict(by_status),
-        "interactions_by_status": dict(inter_stats),
-    }
+    M = models.CampaignMetric
+    rows = db.execute(select(M.campaign_id, M.kind, M.status, M.total).where(M.campaign_id == campaign_id)).all()
+    return _metrics(rows).get(campaign_id, {"parcels_total": 0, "parcels_by_status": {}, "interactions_by_status": {}})
@@ -1,27 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from typing import List, Optional
 from ..db import get_db
 from .. import models
-from ..enrichment import simple_web_lookup, normalize_phone
+from ..enrichment import lookup_cached, apply_result, owner_location
+from ..resolution import resolve_parcel
+from ..security_encryption import decrypt_value
+from ..tasks import enrich_owners_task
 
 router = APIRouter(prefix="/enrichment", tags=["enrichment"])
 
+class EnrichmentBatch(BaseModel):
+    campaign_id: Optional[int] = None
+    state: Optional[str] = None
+    county: Optional[str] = None
+    owner_ids: Optional[List[int]] = None
+    refresh: bool = False
+
+@router.post("/batch", status_code=202)
+def enrich_batch(payload: EnrichmentBatch):
+    task = enrich_owners_task.delay(**payload.model_dump())
+    return {"task_id": task.id}
+
 @router.post("/owner/{owner_id}")
 def enrich_owner(owner_id: int, db: Session = Depends(get_db)):
     owner = db.get(models.Owner, owner_id)
     if not owner:
         raise HTTPException(status_code=404, detail="Owner not found")
-    res = simple_web_lookup(owner.name or "", None, None)
-    updated = False
-    if res.get("phone") and not owner.phone:
-        owner.phone = normalize_phone(res["phone"]) or owner.phone
-        updated = True
-    if res.get("email") and not owner.email:
-        owner.email = res["email"]
-        updated = True
-    if updated:
-        db.commit()
-    return {"updated": updated, "phone": owner.phone, "email": owner.email}
+    res = lookup_cached(db, owner.name or "", *owner_location(db, owner.id))
+    updated = apply_result(owner, res)
+    db.commit()
+    return {"updated": updated, "phone": decrypt_value(owner.phone), "email": decrypt_value(owner.email)}
 
 @router.post("/parcel/{parcel_id}")
 def enrich_parcel(parcel_id: int, db: Session = Depends(get_db)):
@@ -30,12 +40,9 @@ def enrich_parcel(parcel_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Parcel not found")
     if parcel.owner_id:
         return enrich_owner(parcel.owner_id, db)
-    # fallback on owner_name
-    if parcel.owner_name:
-        tmp_owner = models.Owner(name=parcel.owner_name)
-        db.add(tmp_owner)
-        db.flush()
-        parcel.owner_id = tmp_owner.id
+    # link to the canonical owner for owner_name, creating one only when nothing matches
+    owner_id = resolve_parcel(db, parcel)
+    if owner_id:
         db.commit()
-        return enrich_owner(tmp_owner.id, db)
+        return enrich_owner(owner_id, db)
     return {"updated": False}
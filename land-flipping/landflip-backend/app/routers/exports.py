@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import pyarrow.dataset as ds
+from celery.result import AsyncResult
+from typing import List, Optional
+from ..celery_app import celery_app
+from ..export import list_snapshots, snapshot_manifest, open_snapshot, stream_snapshot, PARTITION_KEYS
+from ..tasks import export_parcels_task
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+@router.post("/parcels", status_code=202)
+def create_parcel_export(
+    state: Optional[str] = None,
+    county: Optional[str] = None,
+    campaign_id: Optional[int] = None,
+    with_owners: bool = False,
+    with_interactions: bool = False,
+    partition_by: List[str] = Query(["state"]),
+):
+    unknown = [k for k in partition_by if k not in PARTITION_KEYS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot partition by: {', '.join(unknown)}")
+    task = export_parcels_task.delay(
+        state=state,
+        county=county,
+        campaign_id=campaign_id,
+        with_owners=with_owners,
+        with_interactions=with_interactions,
+        partition_by=partition_by,
+    )
+    return {"task_id": task.id}
+
+@router.get("/parcels/tasks/{task_id}")
+def parcel_export_status(task_id: str):
+    result = AsyncResult(task_id, app=celery_app)
+    out = {"task_id": task_id, "state": result.state}
+    if result.successful():
+        out["snapshot"] = result.result
+    elif result.failed():
+        out["error"] = str(result.result)
+    return out
+
+@router.get("/parcels")
+def parcel_snapshots():
+    return list_snapshots()
+
+@router.get("/parcels/{snapshot_id}")
+def parcel_snapshot(snapshot_id: str):
+    try:
+        manifest = snapshot_manifest(snapshot_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    schema = open_snapshot(snapshot_id).schema
+    return {**manifest, "columns": {f.name: str(f.type) for f in schema}}
+
+@router.get("/parcels/{snapshot_id}/arrow")
+def read_parcel_snapshot(
+    snapshot_id: str,
+    columns: Optional[List[str]] = Query(None),
+    state: Optional[str] = None,
+    county: Optional[str] = None,
+    campaign_id: Optional[int] = None,
+):
+    # bulk reads for ML/reporting jobs: pyarrow.ipc.open_stream(response body) yields record batches
+    try:
+        snapshot_manifest(snapshot_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    names = set(open_snapshot(snapshot_id).schema.names)
+    unknown = [c for c in columns or [] if c not in names]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    filter = None
+    for name, value in (("state", state), ("county", county), ("campaign_id", campaign_id)):
+        if value is not None and name in names:
+            expr = ds.field(name) == value
+            filter = expr if filter is None else filter & expr
+    return StreamingResponse(
+        stream_snapshot(snapshot_id, columns, filter),
+        media_type="application/vnd.apache.arrow.stream",
+    )
@@ -1,7 +1,12 @@
 from fastapi import APIRouter
+from ..middleware import audit_writer
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"status": "ok"}
+
+@router.get("/health/audit")
+def audit_health():
+    return audit_writer.stats()
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Optional
 from ..db import get_db
 from .. import models, schemas
+from ..pagination import paginate
 
 router = APIRouter(prefix="/interactions", tags=["interactions"])
 
-@router.get("/parcel/{parcel_id}", response_model=List[schemas.InteractionOut])
-def list_for_parcel(parcel_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Interaction).filter(models.Interaction.parcel_id == parcel_id).order_by(models.Interaction.id.desc()).all()
+@router.get("/parcel/{parcel_id}", response_model=schemas.Page[schemas.InteractionOut])
+def list_for_parcel(
+    parcel_id: int,
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    q = db.query(models.Interaction).filter(models.Interaction.parcel_id == parcel_id)
+    return paginate(q, models.Interaction.id, cursor, limit)
 
 @router.post("/", response_model=schemas.InteractionOut)
 def create_interaction(payload: schemas.InteractionCreate, db: Session = Depends(get_db)):
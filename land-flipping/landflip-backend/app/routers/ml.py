@@ -1,34 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from celery.result import AsyncResult
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
-from ..db import get_db
-from .. import models
-from ..ml import heuristic_score, train_model, estimate_value
+from typing import Optional
+import os
+import time
+from ..db import get_db, bulk_update
+from .. import models, tiles, features
+from ..ml import heuristic_score_expr, predict_values, list_models, activate_model
+from ..celery_app import celery_app
+from ..tasks import train_model_task
+
+CHUNK_SIZE = int(os.getenv("ML_CHUNK_SIZE", "50000"))
 
 router = APIRouter(prefix="/ml", tags=["ml"])
 
 @router.post("/score")
-def score_all(db: Session = Depends(get_db)):
+def score_all(campaign_id: Optional[int] = None, only_changed: bool = True, db: Session = Depends(get_db)):
+    started = time.perf_counter()
+    P = models.Parcel
+    score = heuristic_score_expr(P.acreage, P.county, P.delinquency_years)
+    criteria = []
+    if campaign_id is not None:
+        criteria.append(P.campaign_id == campaign_id)
+    if only_changed:
+        criteria.append(P.score.is_distinct_from(score))
+    lo, hi = db.query(func.min(P.id), func.max(P.id)).one()
     updated = 0
-    for p in db.query(models.Parcel).all():
-        p.score = heuristic_score(float(p.acreage) if p.acreage is not None else None, p.county)
-        updated += 1
-    db.commit()
-    return {"scored": updated}
-
-@router.post("/train")
-def train(db: Session = Depends(get_db)):
-    parcels = db.query(models.Parcel).all()
+    if lo is not None:
+        # one set-based UPDATE per id range keeps each transaction small
+        for start in range(lo, hi + 1, CHUNK_SIZE):
+            result = db.execute(
+                update(P)
+                .where(P.id >= start, P.id < start + CHUNK_SIZE, *criteria)
+                .values(score=score)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            updated += result.rowcount
+    if updated:
+        tiles.invalidate_all()
+    return {"scored": updated, "seconds": round(time.perf_counter() - started, 3)}
+
+@router.post("/train", status_code=202)
+def train(estimator: str = Query("gbr", pattern="^(gbr|hist)$")):
+    task = train_model_task.delay(estimator)
+    return {"task_id": task.id}
+
+@router.get("/train/{task_id}")
+def train_status(task_id: str):
+    result = AsyncResult(task_id, app=celery_app)
+    out = {"task_id": task_id, "state": result.state}
+    if result.successful():
+        out["model"] = result.result
+    elif result.failed():
+        out["error"] = str(result.result)
+    return out
+
+@router.get("/models")
+def models_list():
+    return list_models()
+
+@router.post("/models/{version}/activate")
+def models_activate(version: str):
     try:
-        path = train_model(parcels)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    return {"model": path}
+        activate_model(version)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model version not found")
+    return {"active": version}
 
 @router.post("/value")
 def value_all(db: Session = Depends(get_db)):
+    started = time.perf_counter()
+    features.sync(db)
     updated = 0
-    for p in db.query(models.Parcel).all():
-        p.valuation = estimate_value(p)
-        updated += 1
-    db.commit()
-    return {"valued": updated}
+    ids = features.present_ids()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        bulk_update(db, "parcels", "valuation", chunk.tolist(), predict_values(features.lookup(chunk)[0]).tolist())
+        db.commit()
+        updated += len(chunk)
+    tiles.invalidate_all()
+    return {"valued": updated, "seconds": round(time.perf_counter() - started, 3)}
@@ -1,20 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 import smtplib
 from email.mime.text import MIMEText
-import os
 from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models
+from ..mailer import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM, SMTP_STARTTLS, configured
+from ..tasks import send_campaign_email
 
 router = APIRouter(prefix="/outreach", tags=["outreach"])
 
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
-SMTP_FROM = os.getenv("SMTP_FROM")
-
 class EmailPayload(BaseModel):
     to: EmailStr
     subject: str
@@ -22,9 +17,16 @@ class EmailPayload(BaseModel):
     parcel_id: int | None = None
     campaign_id: int | None = None
 
+class CampaignEmailPayload(BaseModel):
+    subject: str
+    body: str
+    resend: bool = False
+    concurrency: int | None = Field(None, ge=1, le=32)
+    rate_per_sec: float | None = Field(None, ge=0)
+
 @router.post("/email")
 def send_email(payload: EmailPayload, db: Session = Depends(get_db)):
-    if not all([SMTP_HOST, SMTP_USER, SMTP_PASS, SMTP_FROM]):
+    if not configured():
         raise HTTPException(status_code=500, detail="SMTP not configured")
     msg = MIMEText(payload.body)
     msg["Subject"] = payload.subject
@@ -32,8 +34,10 @@ def send_email(payload: EmailPayload, db: Session = Depends(get_db)):
     msg["To"] = payload.to
     try:
         with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
+            if SMTP_STARTTLS:
+                server.starttls()
+            if SMTP_USER:
+                server.login(SMTP_USER, SMTP_PASS)
             server.sendmail(SMTP_FROM, [payload.to], msg.as_string())
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Email send failed: {e}")
@@ -41,3 +45,19 @@ def send_email(payload: EmailPayload, db: Session = Depends(get_db)):
         db.add(models.Interaction(parcel_id=payload.parcel_id, campaign_id=payload.campaign_id, channel="email", direction="out", status="sent", notes=f"Subject: {payload.subject}"))
         db.commit()
     return {"sent": True}
+
+@router.post("/campaigns/{campaign_id}/email", status_code=202)
+def send_campaign(campaign_id: int, payload: CampaignEmailPayload, db: Session = Depends(get_db)):
+    if not configured():
+        raise HTTPException(status_code=500, detail="SMTP not configured")
+    if not db.get(models.Campaign, campaign_id):
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    task = send_campaign_email.delay(
+        campaign_id,
+        payload.subject,
+        payload.body,
+        resend=payload.resend,
+        concurrency=payload.concurrency,
+        rate=payload.rate_per_sec,
+    )
+    return {"task_id": task.id}
@@ -1,25 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Optional
 from ..db import get_db
 from .. import models, schemas
-from ..security_encryption import encrypt_value, decrypt_value
+from ..pagination import paginate
+from ..security_encryption import protect_contact, decrypt_value, decrypt_many, blind_index
+from ..resolution import owner_keys
+from ..tasks import reindex_owner_contacts, resolve_owners_task
 
 router = APIRouter(prefix="/owners", tags=["owners"])
 
-@router.get("/", response_model=List[schemas.OwnerOut])
-def list_owners(db: Session = Depends(get_db)):
-    owners = db.query(models.Owner).order_by(models.Owner.id.desc()).limit(1000).all()
-    for o in owners:
-        o.email = decrypt_value(o.email)
-        o.phone = decrypt_value(o.phone)
-    return owners
+@router.get("/", response_model=schemas.Page[schemas.OwnerOut])
+def list_owners(
+    db: Session = Depends(get_db),
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    q = db.query(models.Owner)
+    for kind, value, column in (("phone", phone, models.Owner.phone_bidx), ("email", email, models.Owner.email_bidx)):
+        if value is None:
+            continue
+        bidx = blind_index(value, kind)
+        # a value with nothing to index would otherwise compare as IS NULL and match every unindexed owner
+        if bidx is None:
+            raise HTTPException(status_code=400, detail=f"Invalid {kind}")
+        q = q.filter(column == bidx)
+    page = paginate(q, models.Owner.id, cursor, limit)
+    owners = page["items"]
+    emails = decrypt_many(o.email for o in owners)
+    phones = decrypt_many(o.phone for o in owners)
+    for o, e, p in zip(owners, emails, phones):
+        o.email = e
+        o.phone = p
+    return page
 
 @router.post("/", response_model=schemas.OwnerOut)
 def create_owner(payload: schemas.OwnerCreate, db: Session = Depends(get_db)):
     data = payload.model_dump()
-    data["email"] = encrypt_value(data.get("email"))
-    data["phone"] = encrypt_value(data.get("phone"))
+    data.update(protect_contact(data.get("email"), data.get("phone")))
+    data.update(owner_keys(data.get("name")))
     owner = models.Owner(**data)
     db.add(owner)
     db.commit()
@@ -28,6 +49,16 @@ def create_owner(payload: schemas.OwnerCreate, db: Session = Depends(get_db)):
     owner.phone = decrypt_value(owner.phone)
     return owner
 
+@router.post("/reindex", status_code=202)
+def reindex_owners(full: bool = False):
+    task = reindex_owner_contacts.delay(full=full)
+    return {"task_id": task.id}
+
+@router.post("/resolve", status_code=202)
+def resolve_owners(merge: bool = True):
+    task = resolve_owners_task.delay(merge=merge)
+    return {"task_id": task.id}
+
 @router.get("/{owner_id}", response_model=schemas.OwnerOut)
 def get_owner(owner_id: int, db: Session = Depends(get_db)):
     owner = db.get(models.Owner, owner_id)
@@ -37,6 +68,18 @@ def get_owner(owner_id: int, db: Session = Depends(get_db)):
     owner.phone = decrypt_value(owner.phone)
     return owner
 
+@router.get("/{owner_id}/parcels", response_model=schemas.Page[schemas.ParcelOut])
+def owner_parcels(
+    owner_id: int,
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    if not db.get(models.Owner, owner_id):
+        raise HTTPException(status_code=404, detail="Owner not found")
+    q = db.query(models.Parcel).filter(models.Parcel.owner_id == owner_id)
+    return paginate(q, models.Parcel.id, cursor, limit)
+
 @router.delete("/{owner_id}")
 def delete_owner(owner_id: int, db: Session = Depends(get_db)):
     owner = db.get(models.Owner, owner_id)
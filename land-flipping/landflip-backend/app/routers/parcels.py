@@ -1,21 +1,44 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text, func, cast, tuple_, literal, or_, Float
 from sqlalchemy.orm import Session
-from shapely import wkt, wkb
-from shapely.geometry import mapping
-from geoalchemy2.shape import from_shape
-import csv
-import io
+from shapely import wkt
+from geoalchemy2 import Geography
+from geoalchemy2.shape import from_shape, to_shape
 from typing import List, Optional
-import pandas as pd
+import math
 import zipfile
-import tempfile
-import geopandas as gpd
-from ..db import get_db
-from .. import models, schemas
+from ..db import get_db, SessionLocal
+from .. import models, schemas, ingest, tiles
+from ..pagination import paginate, encode_cursor, decode_cursor
+from ..tasks import ingest_job, geocode_parcels_task
+from ..enrichment import fuzzy_match
 
 router = APIRouter(prefix="/parcels", tags=["parcels"])
 
-@router.get("/", response_model=List[schemas.ParcelOut])
+METERS_PER_DEGREE = 111320.0
+
+def _floats(value: str, n: int, name: str) -> List[float]:
+    try:
+        parts = [float(v) for v in value.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != n:
+        raise HTTPException(status_code=400, detail=f"{name} must be {n} comma-separated numbers")
+    return parts
+
+def _distance_page(q, distance, cursor: Optional[str], limit: int) -> dict:
+    last = decode_cursor(cursor, (int, float), int)
+    if last is not None:
+        q = q.filter(tuple_(distance, models.Parcel.id) > tuple_(literal(float(last[0])), literal(last[1])))
+    rows = q.add_columns(distance.label("distance")).order_by(distance, models.Parcel.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        parcel, dist = rows[limit - 1]
+        next_cursor = encode_cursor([dist, parcel.id])
+    return {"items": [r[0] for r in rows[:limit]], "next_cursor": next_cursor}
+
+@router.get("/", response_model=schemas.Page[schemas.ParcelOut])
 def list_parcels(
     db: Session = Depends(get_db),
     owner_name: Optional[str] = None,
@@ -23,6 +46,11 @@ def list_parcels(
     state: Optional[str] = None,
     status: Optional[str] = None,
     campaign_id: Optional[int] = None,
+    bbox: Optional[str] = Query(None, description="minx,miny,maxx,maxy in EPSG:4326"),
+    near: Optional[str] = Query(None, description="lon,lat; results are ordered by distance"),
+    radius_m: Optional[float] = Query(None, gt=0),
+    intersects: Optional[str] = Query(None, description="WKT geometry in EPSG:4326"),
+    cursor: Optional[str] = None,
     limit: int = Query(500, ge=1, le=5000),
 ):
     q = db.query(models.Parcel)
@@ -36,50 +64,137 @@ def list_parcels(
         q = q.filter(models.Parcel.status == status)
     if campaign_id is not None:
         q = q.filter(models.Parcel.campaign_id == campaign_id)
-    return q.order_by(models.Parcel.id.desc()).limit(limit).all()
-
-@router.get("/geojson", response_model=schemas.GeoJSONFeatureCollection)
-def parcels_geojson(db: Session = Depends(get_db), limit: int = Query(1000, ge=1, le=10000)):
-    features = []
-    for p in db.query(models.Parcel).order_by(models.Parcel.id.desc()).limit(limit).all():
-        geom_geojson = None
-        if p.geom is not None:
-            try:
-                shape = wkb.loads(bytes(p.geom.data))
-                geom_geojson = mapping(shape)
-            except Exception:
-                geom_geojson = None
-        props = {
-            "id": p.id,
-            "parcel_id": p.parcel_id,
-            "apn": p.apn,
-            "owner_name": p.owner_name,
-            "county": p.county,
-            "state": p.state,
-            "country": p.country,
-            "acreage": float(p.acreage) if p.acreage is not None else None,
-            "address": p.address,
-            "status": p.status,
-            "score": p.score,
-            "valuation": float(p.valuation) if p.valuation is not None else None,
-        }
-        features.append({"type": "Feature", "geometry": geom_geojson, "properties": props})
-    return {"type": "FeatureCollection", "features": features}
+    if bbox:
+        minx, miny, maxx, maxy = _floats(bbox, 4, "bbox")
+        q = q.filter(models.Parcel.geom.op("&&")(func.ST_MakeEnvelope(minx, miny, maxx, maxy, 4326)))
+    if intersects:
+        try:
+            area = wkt.loads(intersects)
+        except Exception:
+            raise HTTPException(status_code=400, detail="intersects must be valid WKT")
+        q = q.filter(func.ST_Intersects(models.Parcel.geom, func.ST_GeomFromText(area.wkt, 4326)))
+    if radius_m is not None and not near:
+        raise HTTPException(status_code=400, detail="radius_m requires near")
+    if near:
+        lon, lat = _floats(near, 2, "near")
+        point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+        if radius_m is None:
+            # index-assisted nearest-neighbour ordering
+            return _distance_page(q, models.Parcel.geom.op("<->", return_type=Float)(point), cursor, limit)
+        # the degree box lets the GiST index prune before the exact geography test
+        dlat = radius_m / METERS_PER_DEGREE
+        dlon = min(180.0, radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)))
+        geog = cast(models.Parcel.geom, Geography(srid=4326))
+        target = cast(point, Geography(srid=4326))
+        q = q.filter(
+            models.Parcel.geom.op("&&")(func.ST_MakeEnvelope(lon - dlon, lat - dlat, lon + dlon, lat + dlat, 4326)),
+            func.ST_DWithin(geog, target, radius_m),
+        )
+        return _distance_page(q, func.ST_Distance(geog, target), cursor, limit)
+    return paginate(q, models.Parcel.id, cursor, limit)
+
+SEARCH_FIELDS = {
+    "owner_name": models.Parcel.owner_name,
+    "county": models.Parcel.county,
+    "address": models.Parcel.address,
+}
+# trigram candidates fetched per requested hit before the rapidfuzz re-rank
+SEARCH_CANDIDATES = 5
+
+@router.get("/search", response_model=List[schemas.ParcelSearchHit])
+def search_parcels(
+    q: str = Query(..., min_length=2),
+    field: str = Query("owner_name", pattern="^(owner_name|county|address|all)$"),
+    state: Optional[str] = None,
+    limit: int = Query(25, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    columns = list(SEARCH_FIELDS.values()) if field == "all" else [SEARCH_FIELDS[field]]
+    sims = [func.similarity(c, q) for c in columns]
+    similarity = func.greatest(*sims) if len(sims) > 1 else sims[0]
+    query = db.query(models.Parcel, similarity.label("similarity")).filter(or_(*[c.op("%")(q) for c in columns]))
+    if state:
+        query = query.filter(models.Parcel.state == state)
+    rows = query.order_by(similarity.desc(), models.Parcel.id).limit(limit * SEARCH_CANDIDATES).all()
+    hits = []
+    for parcel, sim in rows:
+        score = max((fuzzy_match(q, getattr(parcel, c.key)) for c in columns if getattr(parcel, c.key)), default=0)
+        hits.append((score, float(sim or 0), parcel))
+    hits.sort(key=lambda h: (h[0], h[1]), reverse=True)
+    return [
+        {**schemas.ParcelOut.model_validate(p).model_dump(), "similarity": round(sim, 4), "match_score": score}
+        for score, sim, p in hits[:limit]
+    ]
+
+GEOJSON_PROPERTIES = ("id", "parcel_id", "apn", "owner_name", "county", "state", "country", "acreage", "address", "status", "score", "valuation")
+
+# PostGIS renders each feature; rows leave the database as ready-made JSON text
+_GEOJSON_SQL = text(
+    "SELECT json_build_object("
+    "'type', 'Feature', "
+    "'geometry', ST_AsGeoJSON(geom, :precision)::json, "
+    "'properties', json_build_object(" + ", ".join(f"'{c}', {c}" for c in GEOJSON_PROPERTIES) + ")"
+    ")::text FROM parcels ORDER BY id DESC LIMIT :limit"
+)
+
+def _stream_features(limit: int, precision: int, fmt: str):
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _GEOJSON_SQL,
+            {"limit": limit, "precision": precision},
+            execution_options={"stream_results": True, "yield_per": 1000},
+        )
+        if fmt == "ndjson":
+            for part in result.scalars().partitions():
+                yield "\n".join(part) + "\n"
+            return
+        yield '{"type":"FeatureCollection","features":['
+        sep = ""
+        for part in result.scalars().partitions():
+            yield sep + ",".join(part)
+            sep = ","
+        yield "]}"
+    finally:
+        db.close()
+
+@router.get("/geojson")
+def parcels_geojson(
+    limit: int = Query(1000, ge=1, le=10000),
+    precision: int = Query(9, ge=0, le=15),
+    fmt: str = Query("geojson", alias="format", pattern="^(geojson|ndjson)$"),
+):
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/geo+json"
+    return StreamingResponse(_stream_features(limit, precision, fmt), media_type=media_type)
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+def parcel_tile(z: int, x: int, y: int, request: Request, db: Session = Depends(get_db)):
+    if not (0 <= z <= tiles.MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+    data, etag = tiles.get_tile(db, z, x, y)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
 
 @router.post("/", response_model=schemas.ParcelOut)
 def create_parcel(payload: schemas.ParcelCreate, db: Session = Depends(get_db)):
     geom = None
+    shape = None
     if payload.geom_wkt:
         try:
             shape = wkt.loads(payload.geom_wkt)
             geom = from_shape(shape, srid=4326)
         except Exception:
             geom = None
+            shape = None
     data = payload.model_dump(exclude={"geom_wkt"})
     parcel = models.Parcel(**data, geom=geom)
     db.add(parcel)
     db.commit()
     db.refresh(parcel)
+    if shape is not None:
+        tiles.invalidate_bounds(*shape.bounds)
     return parcel
 
 @router.patch("/{parcel_id}", response_model=schemas.ParcelOut)
@@ -91,140 +206,56 @@ def update_parcel(parcel_id: int, payload: schemas.ParcelUpdate, db: Session = D
         setattr(parcel, k, v)
     db.commit()
     db.refresh(parcel)
+    if parcel.geom is not None:
+        tiles.invalidate_bounds(*to_shape(parcel.geom).bounds)
     return parcel
 
-@router.post("/ingest-csv")
+def _queue_ingest(db: Session, file: UploadFile, kind: str) -> models.IngestJob:
+    # uploads are stored and loaded by the ingest worker; poll GET /parcels/ingest-jobs/{id} for progress
+    job = ingest.store_upload(db, file.file, file.filename, kind)
+    ingest_job.delay(job.id)
+    return job
+
+@router.post("/ingest-csv", response_model=schemas.IngestJobOut, status_code=202)
 def ingest_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
     if not file.filename.lower().endswith((".csv", ".txt")):
         raise HTTPException(status_code=400, detail="Only CSV supported for this endpoint")
-    data = file.file.read().decode("utf-8", errors="ignore")
-    reader = csv.DictReader(io.StringIO(data))
-    count = 0
-    for row in reader:
-        geom = None
-        geom_wkt = row.get("geom_wkt") or row.get("WKT") or row.get("geometry")
-        if geom_wkt:
-            try:
-                shape = wkt.loads(geom_wkt)
-                geom = from_shape(shape, srid=4326)
-            except Exception:
-                geom = None
-        parcel = models.Parcel(
-            parcel_id=row.get("parcel_id") or row.get("ParcelID") or row.get("parcel") or None,
-            apn=row.get("apn") or row.get("APN") or None,
-            owner_name=row.get("owner") or row.get("owner_name") or None,
-            county=row.get("county") or row.get("County") or None,
-            state=row.get("state") or row.get("State") or None,
-            country=row.get("country") or row.get("Country") or None,
-            acreage=(float(row.get("acreage")) if row.get("acreage") else None),
-            address=row.get("address") or None,
-            status=row.get("status") or "lead",
-            geom=geom,
-        )
-        db.add(parcel)
-        count += 1
-        if count % 500 == 0:
-            db.commit()
-    db.commit()
-    return {"ingested": count}
+    return _queue_ingest(db, file, "csv")
 
-@router.post("/ingest-xlsx")
+@router.post("/ingest-xlsx", response_model=schemas.IngestJobOut, status_code=202)
 def ingest_xlsx(file: UploadFile = File(...), db: Session = Depends(get_db)):
     if not file.filename.lower().endswith((".xlsx", ".xls")):
         raise HTTPException(status_code=400, detail="Only XLSX/XLS supported")
-    content = file.file.read()
-    try:
-        df = pd.read_excel(io.BytesIO(content))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read Excel: {e}")
-    # Normalize columns
-    cols = {c.lower().strip(): c for c in df.columns}
-    def get_val(row, keys):
-        for k in keys:
-            if k in cols:
-                v = row[cols[k]]
-                return None if pd.isna(v) else v
-        return None
-    count = 0
-    for _, row in df.iterrows():
-        geom = None
-        geom_wkt = get_val(row, ["geom_wkt", "wkt", "geometry"])
-        if geom_wkt:
-            try:
-                shape = wkt.loads(str(geom_wkt))
-                geom = from_shape(shape, srid=4326)
-            except Exception:
-                geom = None
-        acreage_val = get_val(row, ["acreage", "acres", "size_acres"]) 
-        acreage = float(acreage_val) if acreage_val is not None else None
-        parcel = models.Parcel(
-            parcel_id=str(get_val(row, ["parcel_id", "parcel", "parcelid"]) or "" ) or None,
-            apn=str(get_val(row, ["apn"]) or "") or None,
-            owner_name=str(get_val(row, ["owner", "owner_name"]) or "") or None,
-            county=str(get_val(row, ["county"]) or "") or None,
-            state=str(get_val(row, ["state"]) or "") or None,
-            country=str(get_val(row, ["country"]) or "") or None,
-            acreage=acreage,
-            address=str(get_val(row, ["address"]) or "") or None,
-            status=str(get_val(row, ["status"]) or "lead"),
-            geom=geom,
-        )
-        db.add(parcel)
-        count += 1
-        if count % 500 == 0:
-            db.commit()
-    db.commit()
-    return {"ingested": count}
+    return _queue_ingest(db, file, "xlsx")
 
-@router.post("/ingest-shapefile")
+@router.post("/ingest-shapefile", response_model=schemas.IngestJobOut, status_code=202)
 def ingest_shapefile(file: UploadFile = File(...), db: Session = Depends(get_db)):
     if not file.filename.lower().endswith((".zip",)):
-        raise HTTPException(status_code=400, detail="Upload a zipped Shapefile (.zip)")
-    content = file.file.read()
-    with tempfile.TemporaryDirectory() as tmp:
-        zip_path = f"{tmp}/input.zip"
-        with open(zip_path, "wb") as f:
-            f.write(content)
-        with zipfile.ZipFile(zip_path, "r") as z:
-            z.extractall(tmp)
-        # load all .shp files
-        count = 0
-        for shp in gpd.io.file.fiona.listlayers(tmp):
-            pass
-        # attempt to read any shapefile in folder
-        gdfs = []
-        for path in gpd.io.file.fiona.listdir(tmp):
-            if path.lower().endswith(".shp"):
-                gdfs.append(gpd.read_file(f"{tmp}/{path}").to_crs(4326))
-        if not gdfs:
-            # try generic read
-            try:
-                gdf = gpd.read_file(tmp).to_crs(4326)
-                gdfs = [gdf]
-            except Exception:
-                raise HTTPException(status_code=400, detail="No shapefile found in ZIP")
-        for gdf in gdfs:
-            for _, row in gdf.iterrows():
-                geom = None
-                if row.geometry is not None and not row.geometry.is_empty:
-                    try:
-                        geom = from_shape(row.geometry, srid=4326)
-                    except Exception:
-                        geom = None
-                parcel = models.Parcel(
-                    parcel_id=str(row.get("parcel_id") or row.get("PARCEL_ID") or row.get("APN") or "" ) or None,
-                    apn=str(row.get("apn") or row.get("APN") or "") or None,
-                    county=str(row.get("county") or row.get("COUNTY") or "") or None,
-                    state=str(row.get("state") or row.get("STATE") or "") or None,
-                    country=str(row.get("country") or row.get("COUNTRY") or "US") or None,
-                    acreage=float(row.get("acreage") or row.get("ACRES") or 0) or None,
-                    address=None,
-                    status="lead",
-                    geom=geom,
-                )
-                db.add(parcel)
-                count += 1
-                if count % 500 == 0:
-                    db.commit()
-        db.commit()
-        return {"ingested": count}
+        raise HTTPException(status_code=400, detail="Upload a zipped Shapefile or GeoPackage (.zip)")
+    if not zipfile.is_zipfile(file.file):
+        raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+    file.file.seek(0)
+    return _queue_ingest(db, file, "shapefile")
+
+@router.post("/geocode", status_code=202)
+def geocode_parcels(
+    parcel_ids: Optional[List[int]] = Query(None),
+    campaign_id: Optional[int] = None,
+    refresh: bool = False,
+):
+    task = geocode_parcels_task.delay(parcel_ids=parcel_ids, campaign_id=campaign_id, refresh=refresh)
+    return {"task_id": task.id}
+
+@router.post("/ingest-jobs", response_model=schemas.IngestJobOut, status_code=202)
+def create_ingest_job(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    kind = ingest.job_kind(file.filename)
+    if not kind:
+        raise HTTPException(status_code=400, detail="Upload a CSV, XLSX/XLS or zipped Shapefile/GeoPackage")
+    return _queue_ingest(db, file, kind)
+
+@router.get("/ingest-jobs/{job_id}", response_model=schemas.IngestJobOut)
+def get_ingest_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
@@ -1,19 +1,41 @@
-from fastapi import APIRouter, HTTPException
-import httpx
+from celery.result import AsyncResult
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from typing import List
+from ..celery_app import celery_app
+from ..db import get_db
+from ..geocoding import geocode_batch_async
+from ..tasks import geocode_batch_task
 
 router = APIRouter(prefix="/utils", tags=["utils"])
 
+class GeocodeBatch(BaseModel):
+    addresses: List[str] = Field(..., min_length=1, max_length=1000)
+    refresh: bool = False
+
 @router.get("/geocode")
-async def geocode(address: str):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json", "limit": 1}
-    headers = {"User-Agent": "landflip/1.0"}
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, params=params, headers=headers)
-        if r.status_code != 200:
-            raise HTTPException(status_code=502, detail="Geocoding failed")
-        data = r.json()
-        if not data:
-            return {"found": False}
-        item = data[0]
-        return {"found": True, "lat": float(item["lat"]), "lon": float(item["lon"]) }
+async def geocode(address: str, db: Session = Depends(get_db)):
+    results = await geocode_batch_async(db, [address])
+    if address not in results:
+        raise HTTPException(status_code=502, detail="Geocoding failed")
+    point = results[address]
+    if point is None:
+        return {"found": False}
+    return {"found": True, "lat": point[0], "lon": point[1]}
+
+# at the provider's one request per second a full batch takes minutes, so it runs on the geocode worker
+@router.post("/geocode/batch", status_code=202)
+def geocode_many(payload: GeocodeBatch):
+    task = geocode_batch_task.delay(payload.addresses, refresh=payload.refresh)
+    return {"task_id": task.id}
+
+@router.get("/geocode/batch/{task_id}")
+def geocode_many_status(task_id: str):
+    result = AsyncResult(task_id, app=celery_app)
+    out = {"task_id": task_id, "state": result.state}
+    if result.successful():
+        out.update(result.result)
+    elif result.failed():
+        out["error"] = str(result.result)
+    return out
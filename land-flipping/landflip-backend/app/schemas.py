@@ -1,5 +1,13 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Generic, TypeVar
+from datetime import datetime
+
+T = TypeVar("T")
+
+# Pagination
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 # Users
 class UserCreate(BaseModel):
@@ -63,6 +71,7 @@ class ParcelBase(BaseModel):
     state: Optional[str] = None
     country: Optional[str] = None
     acreage: Optional[float] = None
+    delinquency_years: Optional[float] = None
     address: Optional[str] = None
     status: Optional[str] = None
     score: Optional[int] = None
@@ -79,9 +88,14 @@ class ParcelUpdate(ParcelBase):
 
 class ParcelOut(ParcelBase):
     id: int
+    auction_flagged_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
+class ParcelSearchHit(ParcelOut):
+    similarity: float
+    match_score: int
+
 # Interactions
 class InteractionBase(BaseModel):
     parcel_id: int
@@ -99,6 +113,50 @@ class InteractionOut(InteractionBase):
     class Config:
         from_attributes = True
 
+# Auctions
+class AuctionSourceOut(BaseModel):
+    id: int
+    name: Optional[str] = None
+    url: Optional[str] = None
+    county: Optional[str] = None
+    state: Optional[str] = None
+    country: Optional[str] = None
+    last_crawled_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    crawl_interval_minutes: Optional[int] = None
+    next_crawl_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class AuctionEventOut(BaseModel):
+    id: int
+    source_id: Optional[int] = None
+    parcel_id_text: Optional[str] = None
+    apn_norm: Optional[str] = None
+    parcel_id: Optional[int] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+# Ingest jobs
+class IngestJobOut(BaseModel):
+    id: int
+    kind: str
+    filename: Optional[str] = None
+    status: str
+    chunks_done: int = 0
+    rows_done: int = 0
+    geoms_dropped: int = 0
+    seconds: Optional[float] = None
+    rows_per_sec: Optional[float] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 # GeoJSON
 class GeoJSONFeature(BaseModel):
     type: str
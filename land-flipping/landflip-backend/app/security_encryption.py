@@ -1,10 +1,34 @@
 import base64
+import functools
+import hashlib
+import hmac
+import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.fernet import Fernet, InvalidToken
 
+log = logging.getLogger(__name__)
+
 KEY = os.getenv("ENCRYPTION_KEY", "").encode()
+# a separate key keeps the blind indexes valid across Fernet key rotation. The fallback derived
+# from ENCRYPTION_KEY is kept for deployments that predate it, but ties the indexes to that key:
+# rotating it then means rebuilding them (POST /owners/reindex?full=true)
+BLIND_INDEX_KEY = os.getenv("BLIND_INDEX_KEY", "").encode()
+if not BLIND_INDEX_KEY:
+    BLIND_INDEX_KEY = hashlib.sha256(b"blind-index:" + KEY).digest()
+    if KEY:
+        log.warning("BLIND_INDEX_KEY is not set; deriving it from ENCRYPTION_KEY, so rotating that key invalidates the blind indexes")
+    else:
+        log.warning("BLIND_INDEX_KEY and ENCRYPTION_KEY are not set; blind indexes use a fixed, publicly known key")
+DECRYPT_CACHE_SIZE = int(os.getenv("DECRYPT_CACHE_SIZE", "4096"))
+DECRYPT_WORKERS = int(os.getenv("DECRYPT_WORKERS", "4"))
+# below this many cache misses a pool hand-off costs more than it saves
+DECRYPT_PARALLEL_MIN = 64
+BLIND_INDEX_LENGTH = 32
 
 _cipher = Fernet(KEY) if KEY else None
+_pool: ThreadPoolExecutor | None = None
 
 PREFIX = "enc:"
 
@@ -30,3 +54,53 @@ def decrypt_value(value: str | None) -> str | None:
         return _cipher.decrypt(token).decode()
     except (InvalidToken, Exception):
         return None
+
+
+# keyed by ciphertext, so a re-encrypted value never returns a stale plaintext
+_decrypt_cached = functools.lru_cache(maxsize=DECRYPT_CACHE_SIZE)(decrypt_value)
+
+
+def decrypt_many(values) -> list[str | None]:
+    values = list(values)
+    unique = {v for v in values if v}
+    misses = [v for v in unique if v.startswith(PREFIX)] if _cipher else []
+    if len(misses) >= DECRYPT_PARALLEL_MIN:
+        global _pool
+        if _pool is None:
+            _pool = ThreadPoolExecutor(DECRYPT_WORKERS, thread_name_prefix="decrypt")
+        list(_pool.map(_decrypt_cached, misses, chunksize=max(1, len(misses) // DECRYPT_WORKERS)))
+    plain = {v: _decrypt_cached(v) for v in unique}
+    return [plain.get(v, v) for v in values]
+
+
+def canonical_email(value: str | None) -> str | None:
+    value = (value or "").strip().lower()
+    return value or None
+
+
+def canonical_phone(value: str | None) -> str | None:
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits or None
+
+
+_CANONICAL = {"email": canonical_email, "phone": canonical_phone}
+
+
+def blind_index(value: str | None, kind: str) -> str | None:
+    # deterministic HMAC of the canonical form: equality lookups without decrypting the table
+    value = _CANONICAL[kind](value)
+    if not value:
+        return None
+    digest = hmac.new(BLIND_INDEX_KEY, f"{kind}:{value}".encode(), hashlib.sha256).hexdigest()
+    return digest[:BLIND_INDEX_LENGTH]
+
+
+def protect_contact(email: str | None = None, phone: str | None = None) -> dict:
+    return {
+        "email": encrypt_value(email),
+        "phone": encrypt_value(phone),
+        "email_bidx": blind_index(email, "email"),
+        "phone_bidx": blind_index(phone, "phone"),
+    }
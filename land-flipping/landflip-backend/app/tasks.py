@@ -1,20 +1,173 @@
-from .celery_app import celery_app
-import time
+from .celery_app import celery_app, TASK_TIME_LIMIT
 import requests
 from bs4 import BeautifulSoup
+from sqlalchemy import and_, or_
+from .db import SessionLocal, iter_keyset, bulk_update
+from .idempotency import idempotent
+from . import ingest, features, export, models, mailer, enrichment, resolution, crawler, apn, geocoding
+from .ml import train_model
+from .security_encryption import decrypt_many, blind_index
+
+# acks_late + reject_on_worker_lost: a job whose worker dies is redelivered and
+# resumes after its last committed chunk
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def ingest_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = ingest.run_job(db, job_id)
+        if job is None:
+            return {"job_id": job_id, "status": "missing"}
+        if job.kind == "shapefile" and job.status == "running":
+            # layers load in parallel across the ingest worker's processes, each resuming from its own checkpoint
+            positions = ingest.prepare_layers(db, job)
+            for position in positions:
+                ingest_layer_task.delay(job.id, position)
+            return {"job_id": job.id, "status": job.status, "layers": len(positions)}
+        return {"job_id": job.id, "status": job.status, "rows": job.rows_done}
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def ingest_layer_task(job_id: int, position: int):
+    db = SessionLocal()
+    try:
+        layer = ingest.run_layer(db, job_id, position)
+        if layer is None:
+            return {"job_id": job_id, "position": position, "status": "missing"}
+        return {"job_id": job_id, "position": position, "status": layer.status, "rows": layer.rows_done}
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def train_model_task(estimator: str = "gbr"):
+    db = SessionLocal()
+    try:
+        X, y = features.training_set(db)
+    finally:
+        db.close()
+    return train_model(X, y, estimator)
 
 @celery_app.task
-def scheduled_ingest(source: str):
-    time.sleep(1)
-    return {"status": "ok", "source": source}
+def export_parcels_task(**options):
+    db = SessionLocal()
+    try:
+        return export.export_parcels(db, **options)
+    finally:
+        db.close()
 
 @celery_app.task
+@idempotent(ttl=TASK_TIME_LIMIT)
+def reindex_owner_contacts(chunk_size: int = 5000, full: bool = False):
+    # fills blind indexes for owners written before they existed; full recomputes every one,
+    # e.g. after BLIND_INDEX_KEY changed
+    O = models.Owner
+    db = SessionLocal()
+    indexed = 0
+    try:
+        if full:
+            criteria = [or_(O.email.isnot(None), O.phone.isnot(None))]
+        else:
+            criteria = [or_(and_(O.email.isnot(None), O.email_bidx.is_(None)), and_(O.phone.isnot(None), O.phone_bidx.is_(None)))]
+        for rows in iter_keyset(db, (O.id, O.email, O.phone), chunk_size, *criteria):
+            ids, emails, phones = zip(*rows)
+            emails, phones = decrypt_many(emails), decrypt_many(phones)
+            bulk_update(db, "owners", "email_bidx", ids, [blind_index(v, "email") for v in emails])
+            bulk_update(db, "owners", "phone_bidx", ids, [blind_index(v, "phone") for v in phones])
+            db.commit()
+            indexed += len(ids)
+        return {"indexed": indexed}
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def send_campaign_email(campaign_id: int, subject: str, body: str, resend: bool = False, concurrency: int | None = None, rate: float | None = None):
+    # parcels already mailed for this campaign are skipped, so a redelivered task resumes
+    return mailer.send_campaign(campaign_id, subject, body, resend=resend, concurrency=concurrency, rate=rate)
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def enrich_owners_task(campaign_id=None, state=None, county=None, owner_ids=None, refresh=False):
+    db = SessionLocal()
+    try:
+        return enrichment.enrich_owners(db, campaign_id=campaign_id, state=state, county=county, owner_ids=owner_ids, refresh=refresh)
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def resolve_owners_task(merge: bool = True):
+    db = SessionLocal()
+    try:
+        return resolution.resolve_all(db, merge=merge)
+    finally:
+        db.close()
+
+@celery_app.task(soft_time_limit=900, time_limit=960)
+@idempotent(ttl=960)
+def crawl_auction_sources(source_ids=None):
+    db = SessionLocal()
+    try:
+        stats = crawler.crawl_sources(db, source_ids)
+        if stats["events"]:
+            stats["match"] = apn.match_events(db)
+        return stats
+    finally:
+        db.close()
+
+@celery_app.task(soft_time_limit=60, time_limit=90)
+def dispatch_due_auction_sources():
+    # beat runs this every minute; claimed sources are already pushed to their next slot
+    db = SessionLocal()
+    try:
+        ids = crawler.claim_due_sources(db)
+    finally:
+        db.close()
+    for i in range(0, len(ids), crawler.CRAWL_BATCH_SIZE):
+        crawl_auction_sources.delay(ids[i:i + crawler.CRAWL_BATCH_SIZE])
+    return {"dispatched": len(ids)}
+
+@celery_app.task(soft_time_limit=900, time_limit=960)
+@idempotent(ttl=960)
+def match_auction_events(rematch: bool = False):
+    db = SessionLocal()
+    try:
+        return apn.match_events(db, rematch=rematch)
+    finally:
+        db.close()
+
+@celery_app.task(soft_time_limit=60, time_limit=90)
 def run_scraper(url: str):
     r = requests.get(url, timeout=20, headers={"User-Agent": "landflip/1.0"})
     soup = BeautifulSoup(r.text, "html.parser")
     return {"length": len(soup.get_text())}
 
-@celery_app.task
+@celery_app.task(soft_time_limit=60, time_limit=90)
 def geocode_address(address: str):
-    # placeholder; use utils endpoint on demand
-    return {"address": address}
+    db = SessionLocal()
+    try:
+        return geocoding.result_row(address, geocoding.geocode_batch(db, [address]))
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def geocode_batch_task(addresses: list, refresh: bool = False):
+    db = SessionLocal()
+    try:
+        results = geocoding.geocode_batch(db, addresses, refresh=refresh)
+    finally:
+        db.close()
+    return {"results": [geocoding.result_row(a, results) for a in addresses]}
+
+@celery_app.task(acks_late=True)
+@idempotent(ttl=TASK_TIME_LIMIT)
+def geocode_parcels_task(parcel_ids=None, campaign_id=None, refresh=False):
+    db = SessionLocal()
+    try:
+        return geocoding.geocode_parcels(db, parcel_ids=parcel_ids, campaign_id=campaign_id, refresh=refresh)
+    finally:
+        db.close()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import hashlib
+import math
+import os
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+TILE_CACHE_URL = os.getenv("TILE_CACHE_URL", "redis://redis:6379/2")
+TILE_CACHE_TTL = int(os.getenv("TILE_CACHE_TTL", "86400"))
+TILE_CACHE_MAXZOOM = int(os.getenv("TILE_CACHE_MAXZOOM", "16"))
+MAX_ZOOM = 22
+EXTENT = 4096
+WORLD_METERS = 40075016.68557849
+
+# properties that may be exposed in tiles, with the SQL used to encode them
+ALLOWED_PROPERTIES = {
+    "parcel_id": "p.parcel_id",
+    "apn": "p.apn",
+    "owner_name": "p.owner_name",
+    "county": "p.county",
+    "state": "p.state",
+    "country": "p.country",
+    "acreage": "p.acreage::float8",
+    "status": "p.status",
+    "score": "p.score",
+    "valuation": "p.valuation::float8",
+    "campaign_id": "p.campaign_id",
+}
+TILE_PROPERTIES = [
+    c for c in (c.strip() for c in os.getenv("TILE_PROPERTIES", "status,score,valuation").split(","))
+    if c in ALLOWED_PROPERTIES
+]
+
+_TILE_SQL = text(
+    "WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geom) "
+    f"SELECT ST_AsMVT(t, 'parcels', {EXTENT}, 'geom', 'id') FROM ("
+    "SELECT p.id"
+    + "".join(f", {ALLOWED_PROPERTIES[c]} AS {c}" for c in TILE_PROPERTIES)
+    + f", ST_AsMVTGeom(ST_SimplifyPreserveTopology(ST_Transform(p.geom, 3857), :tolerance), bounds.geom, {EXTENT}, 64, true) AS geom "
+    "FROM parcels p, bounds "
+    "WHERE p.geom && ST_Transform(bounds.geom, 4326)"
+    ") t WHERE t.geom IS NOT NULL"
+)
+
+_GENERATION_KEY = "tile:gen"
+# past this many tiles a targeted invalidation costs more than starting over
+_MAX_TARGETED = 5000
+
+_client: redis.Redis | None = None
+
+
+def _cache() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(TILE_CACHE_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
+
+
+def _stamp_key(z: int, x: int, y: int) -> str:
+    return f"tile:stamp:{z}:{x}:{y}"
+
+
+def _key(generation, stamp, z: int, x: int, y: int) -> str:
+    return f"tile:{int(generation or 0)}.{int(stamp or 0)}:{z}:{x}:{y}"
+
+
+def tolerance(z: int) -> float:
+    # one tile pixel, in EPSG:3857 metres
+    return WORLD_METERS / (2 ** z * EXTENT)
+
+
+def etag_for(data: bytes) -> str:
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+
+def render_tile(db: Session, z: int, x: int, y: int) -> bytes:
+    data = db.execute(_TILE_SQL, {"z": z, "x": x, "y": y, "tolerance": tolerance(z)}).scalar()
+    return bytes(data) if data is not None else b""
+
+
+def get_tile(db: Session, z: int, x: int, y: int) -> tuple[bytes, str]:
+    key = None
+    if z <= TILE_CACHE_MAXZOOM:
+        try:
+            # the key is fixed before rendering: a render that overlaps an invalidation stores its
+            # (possibly pre-commit) tile under a key that is no longer read
+            key = _key(*_cache().mget(_GENERATION_KEY, _stamp_key(z, x, y)), z, x, y)
+            cached = _cache().hgetall(key)
+            if cached:
+                return cached[b"data"], cached[b"etag"].decode()
+        except redis.RedisError:
+            key = None
+    data = render_tile(db, z, x, y)
+    etag = etag_for(data)
+    if key is not None:
+        try:
+            pipe = _cache().pipeline()
+            pipe.hset(key, mapping={"data": data, "etag": etag})
+            pipe.expire(key, TILE_CACHE_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    return data, etag
+
+
+def tile_range(z: int, minx: float, miny: float, maxx: float, maxy: float) -> tuple[int, int, int, int]:
+    n = 2 ** z
+
+    def tx(lon: float) -> int:
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def ty(lat: float) -> int:
+        lat = max(-85.0511, min(85.0511, lat))
+        r = math.radians(lat)
+        return min(n - 1, max(0, int((1.0 - math.asinh(math.tan(r)) / math.pi) / 2.0 * n)))
+
+    return tx(minx), ty(maxy), tx(maxx), ty(miny)
+
+
+def invalidate_all() -> None:
+    try:
+        _cache().incr(_GENERATION_KEY)
+    except redis.RedisError:
+        pass
+
+
+def invalidate_bounds(minx: float, miny: float, maxx: float, maxy: float) -> None:
+    ranges = [(z, *tile_range(z, minx, miny, maxx, maxy)) for z in range(TILE_CACHE_MAXZOOM + 1)]
+    total = sum((x1 - x0 + 1) * (y1 - y0 + 1) for _, x0, y0, x1, y1 in ranges)
+    if total > _MAX_TARGETED:
+        invalidate_all()
+        return
+    try:
+        pipe = _cache().pipeline(transaction=False)
+        for z, x0, y0, x1, y1 in ranges:
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    pipe.incr(_stamp_key(z, x, y))
+                    # outlives any tile cached under the previous stamp, so an expired stamp never
+                    # brings one back
+                    pipe.expire(_stamp_key(z, x, y), 2 * TILE_CACHE_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        pass
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# set before app modules read their configuration at import time
+_tmp = tempfile.mkdtemp(prefix="landflip-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+os.environ.setdefault("IDEMPOTENCY_URL", "memory://")
+os.environ.setdefault("RATE_LIMIT_URL", "memory://")
+os.environ.setdefault("ENCRYPTION_KEY", "2xS-tFiM6xrvDGTartE9LUW7Nx20VBVBWjyRLWswKkE=")
+os.environ.setdefault("BLIND_INDEX_KEY", "test-blind-index-key")
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import models
+from app.db import engine, SessionLocal
+
+
+@pytest.fixture
+def stub_server():
+    # starts local HTTP servers; `respond(handler)` returns (status, headers, body) for each GET
+    servers = []
+
+    def start(respond):
+        requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests.append({"path": self.path, "headers": dict(self.headers)})
+                status, headers, body = respond(self)
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        srv.url = f"http://127.0.0.1:{srv.server_port}"
+        srv.requests = requests
+        servers.append(srv)
+        return srv
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+@pytest.fixture
+def db_tables(monkeypatch):
+    # creates the named tables on the sqlite test database; modules' Postgres upserts use sqlite's
+    # equivalent ON CONFLICT clause. Tables with PostGIS columns cannot be created here.
+    from app import crawler, enrichment, geocoding
+    for module in (crawler, enrichment, geocoding):
+        monkeypatch.setattr(module, "pg_insert", sqlite_insert)
+    created = []
+
+    def create(*names):
+        tables = [models.Base.metadata.tables[n] for n in names]
+        models.Base.metadata.create_all(engine, tables=tables)
+        created.extend(tables)
+        return SessionLocal()
+
+    yield create
+    models.Base.metadata.drop_all(engine, tables=created)
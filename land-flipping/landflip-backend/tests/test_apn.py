@@ -0,0 +1,57 @@
+import pytest
+from app.apn import _pick, event_apn, extract_apns, normalize_apn
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("APN 012-345-67 2023", {"012-345-67"}),
+    ("APN: 012-345-67\n1500", {"012-345-67"}),
+    ("APN 012-345-67 $1,500", {"012-345-67"}),
+    ("APN 012 345 67 2023", {"012 345 67"}),
+    ("APN 012 345 67 1,500.00", {"012 345 67"}),
+    ("APN 012 345 67\n1500", {"012 345 67"}),
+    ("Parcel No. 12-34-567, minimum bid $900", {"12-34-567"}),
+    ("PARCEL ID: R12.345.678", {"R12.345.678"}),
+    ("APN#0123456", {"0123456"}),
+    ("PINEWOOD 45678", set()),
+    ("Parcels 45678 and 99999", set()),
+    ("APN 012-345-67 then APN 999-888-77", {"012-345-67", "999-888-77"}),
+])
+def test_extract_apns(text, expected):
+    assert set(extract_apns(text)) == expected
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("APN:012-345-67", "01234567"),
+    ("PIN 12345", "12345"),
+    ("Parcel No. 12-34-567", "1234567"),
+    ("PINE-12345", "PINE12345"),
+    ("012 345 67", "01234567"),
+    ("APN 9", None),
+    ("ABCDEF", None),
+])
+def test_event_apn(token, expected):
+    assert event_apn(token) == expected
+
+
+def test_normalized_event_matches_parcel_column():
+    [token] = extract_apns("Sale list: APN 012-345-67 2023 taxes $1,500")
+    assert event_apn(token) == normalize_apn("012-345-67")
+
+
+# (parcel id, state, county key) as built by _parcels_for
+CANDIDATES = [(1, "TX", "travis"), (2, "TX", "bexar"), (3, "OK", "travis"), (4, "TX", "")]
+
+
+@pytest.mark.parametrize("candidates, state, county, expected", [
+    (CANDIDATES[:3], "TX", "Travis County", 1),
+    (CANDIDATES[:3], "OK", "TRAVIS", 3),
+    # two Texas parcels share the APN and the source names no county
+    (CANDIDATES[:3], "TX", "", None),
+    # a parcel with no county could be the one in Travis
+    (CANDIDATES, "TX", "Travis", None),
+    # the only candidate is in another county
+    (CANDIDATES[1:2], "TX", "Travis", None),
+    (CANDIDATES[1:2], None, None, 2),
+])
+def test_pick_narrows_by_county_then_state(candidates, state, county, expected):
+    assert _pick(candidates, state, county) == expected
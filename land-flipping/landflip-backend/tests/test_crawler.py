@@ -0,0 +1,70 @@
+from app import crawler, models
+from app.apn import extract_apns
+
+PAGE = "<html><body><table><tr><td>APN 012-345-67</td><td>$1,500</td><td>APN 999-888-77</td></tr></table></body></html>"
+
+
+def test_page_text_keeps_cell_boundaries():
+    text = crawler.page_text(PAGE.encode())
+    assert "APN 012-345-67 $1,500 APN 999-888-77" in " ".join(text.split())
+    assert set(extract_apns(text)) == {"012-345-67", "999-888-77"}
+
+
+def test_page_text_empty_body():
+    assert crawler.page_text(b"") == ""
+
+
+def _source(url, **kw):
+    return {"id": 1, "url": url, "etag": None, "last_modified": None, "content_hash": None, **kw}
+
+
+def test_crawl_uses_conditional_get(stub_server):
+    def respond(req):
+        if req.headers.get("If-None-Match") == '"v1"':
+            return 304, {}, b""
+        return 200, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, PAGE
+
+    srv = stub_server(respond)
+    [first] = crawler.asyncio.run(crawler.crawl([_source(srv.url + "/list")]))
+    assert first["status"] == "changed"
+    assert set(first["tokens"]) == {"012-345-67", "999-888-77"}
+
+    [second] = crawler.asyncio.run(crawler.crawl([_source(srv.url + "/list", etag=first["etag"], last_modified=first["last_modified"])]))
+    assert second["status"] == "not_modified"
+    assert srv.requests[-1]["headers"]["If-None-Match"] == '"v1"'
+    assert srv.requests[-1]["headers"]["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_crawl_skips_unchanged_body(stub_server):
+    srv = stub_server(lambda req: (200, {}, PAGE))
+    [first] = crawler.asyncio.run(crawler.crawl([_source(srv.url)]))
+    [second] = crawler.asyncio.run(crawler.crawl([_source(srv.url, content_hash=first["content_hash"])]))
+    assert second["status"] == "unchanged"
+    assert second["tokens"] == {}
+
+
+def test_crawl_reports_http_errors(stub_server):
+    srv = stub_server(lambda req: (500, {}, "boom"))
+    [res] = crawler.asyncio.run(crawler.crawl([_source(srv.url)]))
+    assert res["status"] == "failed"
+    assert "500" in res["error"]
+
+
+def test_crawl_source_stores_each_event_once(stub_server, db_tables):
+    pages = [PAGE, PAGE.replace("</table>", "<tr><td>APN 555-444-33</td></tr></table>")]
+    srv = stub_server(lambda req: (200, {}, pages[0]))
+    db = db_tables("auction_sources", "auction_events")
+    try:
+        db.add(models.AuctionSource(id=1, name="county", url=srv.url))
+        db.commit()
+        assert crawler.crawl_source(db, 1)["events"] == 2
+        assert crawler.crawl_source(db, 1)["status"] == "unchanged"
+        pages[0] = pages[1]
+        res = crawler.crawl_source(db, 1)
+        assert res["status"] == "changed"
+        assert res["events"] == 1
+        assert db.query(models.AuctionEvent).count() == 3
+        source = db.get(models.AuctionSource, 1)
+        assert source.last_crawled_at is not None and source.last_error is None
+    finally:
+        db.close()
@@ -0,0 +1,37 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+from app import enrichment, models
+
+PAGE = "<html><body><p>Jane Roe</p><p>Call (512) 555-0142 or jane.roe@example.com</p></body></html>"
+
+
+def test_lookup_many_and_cache(stub_server, db_tables, monkeypatch):
+    def respond(req):
+        q = parse_qs(urlsplit(req.path).query)["q"][0]
+        if q.startswith("Broken"):
+            return 503, {}, b"unavailable"
+        return 200, {"Content-Type": "text/html"}, PAGE if q.startswith("Jane") else "<html>no results</html>"
+
+    srv = stub_server(respond)
+    monkeypatch.setattr(enrichment, "ENRICHMENT_LOOKUP_URL", srv.url + "/html/")
+    queries = {
+        enrichment.cache_key("Jane Roe", "Travis", "TX"): ("Jane Roe", "Travis", "TX"),
+        enrichment.cache_key("John Doe", None, "TX"): ("John Doe", None, "TX"),
+        enrichment.cache_key("Broken Owner", None, None): ("Broken Owner", None, None),
+    }
+    found = asyncio.run(enrichment.lookup_many(queries))
+    jane, john, broken = queries
+    assert found[jane] == {"phone": "+15125550142", "email": "jane.roe@example.com", "raw_hits": 2}
+    assert found[john] == {"phone": None, "email": None, "raw_hits": 0}
+    # failed lookups are left out so the next run retries them
+    assert broken not in found
+    assert len(srv.requests) == 3
+    assert parse_qs(urlsplit(srv.requests[0]["path"]).query)["q"][0].endswith("phone email")
+
+    db = db_tables("enrichment_cache")
+    enrichment.store_results(db, found)
+    db.commit()
+    # contact fields are encrypted at rest and decrypted on the way out
+    stored = db.query(models.EnrichmentCache).filter_by(key=jane).one()
+    assert stored.email != "jane.roe@example.com"
+    assert enrichment.cached_results(db, list(queries)) == found
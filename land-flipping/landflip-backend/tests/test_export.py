@@ -0,0 +1,76 @@
+import pyarrow as pa
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import export
+from app.routers import exports
+
+
+@pytest.fixture
+def fake_parcels(monkeypatch, tmp_path):
+    # 3000 counties in a single batch: more partitions than pyarrow's default limit of 1024
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+
+    def batches(db, q, schema, stats):
+        n = 3000
+        data = {f.name: pa.nulls(n, f.type) for f in schema}
+        data["id"] = pa.array(range(1, n + 1), pa.int64())
+        data["state"] = pa.array(["TX" if i % 2 else "NM" for i in range(n)])
+        data["county"] = pa.array([f"county-{i:04d}" for i in range(n)])
+        stats["rows"] += n
+        yield pa.RecordBatch.from_arrays([data[f.name] for f in schema], schema=schema)
+
+    monkeypatch.setattr(export, "_batches", batches)
+
+
+def test_export_with_many_partitions(fake_parcels):
+    manifest = export.export_parcels(None, partition_by=["state", "county"])
+    assert manifest["rows"] == 3000
+    table = export.read_snapshot(manifest["snapshot_id"], columns=["id", "county"])
+    assert table.num_rows == 3000
+    assert [s["snapshot_id"] for s in export.list_snapshots()] == [manifest["snapshot_id"]]
+
+
+def test_arrow_read_api(fake_parcels):
+    manifest = export.export_parcels(None, partition_by=["state"])
+    app = FastAPI()
+    app.include_router(exports.router)
+    client = TestClient(app)
+
+    info = client.get(f"/exports/parcels/{manifest['snapshot_id']}").json()
+    assert info["rows"] == 3000 and "geom_wkb" in info["columns"]
+
+    r = client.get(f"/exports/parcels/{manifest['snapshot_id']}/arrow", params={"columns": ["id", "county"], "state": "TX"})
+    assert r.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.column_names == ["id", "county"]
+    assert table.num_rows == 1500
+
+    assert client.get(f"/exports/parcels/{manifest['snapshot_id']}/arrow", params={"columns": ["nope"]}).status_code == 400
+    assert client.get("/exports/parcels/20000101T000000000000Z").status_code == 404
+    assert client.get("/exports/parcels/../../etc/arrow").status_code == 404
+
+
+def test_partition_columns_keep_exported_types(monkeypatch, tmp_path):
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+
+    def batches(db, q, schema, stats):
+        data = {f.name: pa.nulls(4, f.type) for f in schema}
+        data["id"] = pa.array([1, 2, 3, 4], pa.int64())
+        data["county"] = pa.array(["001", "003", "001", "010"])
+        data["campaign_id"] = pa.array([7, 7, 8, 8], pa.int64())
+        stats["rows"] += 4
+        yield pa.RecordBatch.from_arrays([data[f.name] for f in schema], schema=schema)
+
+    monkeypatch.setattr(export, "_batches", batches)
+    manifest = export.export_parcels(None, partition_by=["county", "campaign_id"])
+    table = export.read_snapshot(manifest["snapshot_id"], columns=["id", "county", "campaign_id"])
+    assert table.schema.field("county").type == pa.string()
+    assert table.schema.field("campaign_id").type == pa.int64()
+    assert sorted(table.column("county").to_pylist()) == ["001", "001", "003", "010"]
+
+    app = FastAPI()
+    app.include_router(exports.router)
+    r = TestClient(app).get(f"/exports/parcels/{manifest['snapshot_id']}/arrow", params={"columns": ["id"], "county": "001", "campaign_id": 8})
+    assert r.status_code == 200
+    assert pa.ipc.open_stream(r.content).read_all().column("id").to_pylist() == [3]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from app import features
+from app.ml import N_FEATURES
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(features, "FEATURE_DIR", str(tmp_path))
+    rows = features._grow(features._FEATURES, (16, N_FEATURES), np.float64)
+    present = features._grow(features._PRESENT, (16,), np.bool_)
+    rows[:] = np.arange(16)[:, None]
+    present[1:9] = True
+    rows.flush()
+    present.flush()
+    return present
+
+
+def test_lookup_returns_views_for_contiguous_ids(store):
+    X, known = features.lookup(np.arange(2, 6))
+    assert known.all()
+    # a slice of the read-only memory map, not a copy
+    assert not X.flags.writeable
+    assert X[:, 0].tolist() == [2, 3, 4, 5]
+
+    X, known = features.lookup([3, 0, 5, 40])
+    assert known.tolist() == [True, False, True, False]
+    assert X[:, 0].tolist() == [3, 5]
+    assert X.flags.writeable
+
+
+def test_sync_clears_deleted_parcels(store, monkeypatch):
+    # parcels 3 and 7 were deleted since the last sync
+    monkeypatch.setattr(features, "iter_keyset", lambda db, columns, size: iter([[(i,) for i in (1, 2, 4, 5, 6, 8)]]))
+    features._forget_deleted(None, store)
+    assert features.present_ids().tolist() == [1, 2, 4, 5, 6, 8]
+    assert features.lookup([3, 4])[1].tolist() == [False, True]
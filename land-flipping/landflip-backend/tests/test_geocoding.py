@@ -0,0 +1,60 @@
+import json
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from app import geocoding, models
+from app.ratelimit import TokenBucket, shared_bucket
+from app.tasks import geocode_batch_task
+
+POINTS = {"1 main st": [{"lat": "30.1", "lon": "-97.2"}], "2 oak rd": []}
+
+
+@pytest.fixture
+def geocoder(stub_server, db_tables, monkeypatch):
+    def respond(req):
+        q = parse_qs(urlsplit(req.path).query)["q"][0]
+        if q.startswith("500"):
+            return 500, {}, b"error"
+        return 200, {"Content-Type": "application/json"}, json.dumps(POINTS[geocoding.normalize_address(q)])
+
+    srv = stub_server(respond)
+    monkeypatch.setattr(geocoding, "GEOCODER_URL", srv.url + "/search")
+    monkeypatch.setattr(geocoding, "_bucket", TokenBucket(0))
+    monkeypatch.setattr(geocoding, "_lru", OrderedDict())
+    srv.db = db_tables("geocode_cache")
+    return srv
+
+
+def test_batch_geocoder_caches_results(geocoder):
+    db = geocoder.db
+    addresses = ["1 Main Street", "1 main st.", "2 Oak Road", "500 Error Ave", ""]
+    results = geocoding.geocode_batch(db, addresses)
+    assert results["1 Main Street"] == results["1 main st."] == (30.1, -97.2)
+    assert results["2 Oak Road"] is None
+    assert "500 Error Ave" not in results
+    assert results[""] is None
+    # one request per distinct normalized address
+    assert len(geocoder.requests) == 3
+
+    # found points and misses are cached; the failure is asked again
+    cached = {k: (lat, lon) for k, lat, lon in db.query(models.GeocodeCache.key, models.GeocodeCache.lat, models.GeocodeCache.lon)}
+    assert cached == {"1 main st": (30.1, -97.2), "2 oak rd": (None, None)}
+    geocoding._lru.clear()
+    geocoding.geocode_batch(db, addresses)
+    assert len(geocoder.requests) == 4
+
+    geocoding.geocode_batch(db, ["1 Main Street"], refresh=True)
+    assert len(geocoder.requests) == 5
+
+
+def test_geocode_batch_task(geocoder):
+    out = geocode_batch_task(["1 Main Street", "2 Oak Road", "500 Error Ave"])
+    assert out["results"] == [
+        {"address": "1 Main Street", "status": "found", "lat": 30.1, "lon": -97.2},
+        {"address": "2 Oak Road", "status": "not_found"},
+        {"address": "500 Error Ave", "status": "failed"},
+    ]
+
+
+def test_shared_bucket_without_redis_is_local():
+    assert isinstance(shared_bucket("geocoder", 1, url="memory://"), TokenBucket)
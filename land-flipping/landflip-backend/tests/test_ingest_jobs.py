@@ -0,0 +1,94 @@
+import io
+import os
+import zipfile
+import geopandas as gpd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from shapely.geometry import box
+from app import ingest, models, tiles
+from app.routers import parcels
+
+
+@pytest.fixture
+def jobs(db_tables, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, "INGEST_DIR", str(tmp_path / "uploads"))
+    # COPY needs PostgreSQL; count the rows each chunk would load instead
+    monkeypatch.setattr(ingest, "copy_parcels", lambda db, frame: len(frame))
+    monkeypatch.setattr(tiles, "invalidate_all", lambda: None)
+    return db_tables("ingest_jobs", "ingest_job_layers")
+
+
+def _archive(tmp_path) -> bytes:
+    path = str(tmp_path / "parcels.gpkg")
+    for layer, n in (("north", 3), ("south", 2)):
+        frame = gpd.GeoDataFrame({"apn": [f"{layer}-{i}" for i in range(n)]}, geometry=[box(i, 0, i + 1, 1) for i in range(n)], crs="EPSG:4326")
+        frame.to_file(path, layer=layer, driver="GPKG")
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.write(path, "parcels.gpkg")
+    return buf.getvalue()
+
+
+def test_upload_endpoints_queue_jobs(jobs, monkeypatch):
+    queued = []
+    monkeypatch.setattr(parcels.ingest_job, "delay", queued.append)
+    app = FastAPI()
+    app.include_router(parcels.router)
+    client = TestClient(app)
+
+    r = client.post("/parcels/ingest-csv", files={"file": ("parcels.csv", b"apn,owner_name\n1,A\n")})
+    assert r.status_code == 202
+    job = r.json()
+    assert (job["kind"], job["status"]) == ("csv", "queued")
+    assert queued == [job["id"]]
+    assert client.get(f"/parcels/ingest-jobs/{job['id']}").json()["status"] == "queued"
+
+    r = client.post("/parcels/ingest-shapefile", files={"file": ("parcels.zip", b"not a zip")})
+    assert r.status_code == 400
+    assert queued == [job["id"]]
+
+
+def test_shapefile_job_loads_layers_independently(jobs, tmp_path):
+    db = jobs
+    job = ingest.store_upload(db, io.BytesIO(_archive(tmp_path)), "parcels.zip", "shapefile", batch_size=1)
+    assert ingest.run_job(db, job.id).status == "running"
+    assert ingest.prepare_layers(db, job) == [0, 1]
+
+    # a layer redelivered after its first chunk resumes from its checkpoint
+    first = db.query(models.IngestJobLayer).filter_by(job_id=job.id, position=0).one()
+    first.chunks_done, first.rows_done = 1, 1
+    db.commit()
+    assert ingest.run_layer(db, job.id, 0).rows_done == 3
+    db.refresh(job)
+    assert (job.status, job.rows_done) == ("running", 2)
+    assert ingest.prepare_layers(db, job) == [1]
+
+    assert ingest.run_layer(db, job.id, 1).rows_done == 2
+    db.refresh(job)
+    assert (job.status, job.rows_done, job.chunks_done) == ("done", 4, 4)
+    assert not os.path.exists(job.path)
+    assert not os.path.exists(job.path + ".d")
+
+
+CSV_WITH_GEOMETRIES = b'''apn,wkt
+1,"POLYGON ((0 0, 1 0, 1 1, 0 0))"
+2,"MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)))"
+3,"MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((5 5, 6 5, 6 6, 5 5)))"
+4,POINT (1 2)
+5,not wkt
+6,
+'''
+
+
+def test_non_polygon_geometries_are_counted(jobs):
+    db = jobs
+    frame = next(ingest.csv_batches(io.BytesIO(CSV_WITH_GEOMETRIES)))
+    assert frame["geom"].notna().tolist() == [True, True, False, False, False, False]
+    assert frame["geom_dropped"].tolist() == [False, False, True, True, True, False]
+    # the single-part MultiPolygon is stored as its Polygon
+    assert frame["geom"][1] == frame["geom"][0]
+
+    job = ingest.store_upload(db, io.BytesIO(CSV_WITH_GEOMETRIES), "parcels.csv", "csv")
+    job = ingest.run_job(db, job.id)
+    assert (job.status, job.rows_done, job.geoms_dropped) == ("done", 6, 3)
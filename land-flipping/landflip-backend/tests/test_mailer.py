@@ -0,0 +1,79 @@
+import asyncio
+import socket
+from decimal import Decimal
+import pytest
+from aiosmtpd.controller import Controller
+from app import mailer
+from app.ratelimit import TokenBucket
+
+
+class Sink:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject"):
+            return "550 no such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.content.decode())
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(mailer, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(mailer, "SMTP_PORT", port)
+    monkeypatch.setattr(mailer, "SMTP_FROM", "offers@example.com")
+    monkeypatch.setattr(mailer, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(mailer, "SMTP_USER", None)
+    yield sink
+    controller.stop()
+
+
+def _send(messages, senders=1):
+    async def run():
+        queue: asyncio.Queue = asyncio.Queue()
+        results: list = []
+        for item in messages:
+            queue.put_nowait(item)
+        for _ in range(senders):
+            queue.put_nowait(None)
+        await asyncio.gather(*(mailer._sender(queue, TokenBucket(0), results) for _ in range(senders)))
+        return results
+    return asyncio.run(run())
+
+
+def test_render_formats_fields():
+    context = {"owner_name": "Jane Roe", "offer_min": Decimal("1500.00"), "apn": None}
+    assert mailer.render("Hi {{ owner_name }}, {{offer_min}} for {{apn}}{{missing}}.", context) == "Hi Jane Roe, 1500 for ."
+
+
+def test_sender_reuses_one_connection(smtp):
+    messages = [(i, mailer.build_message(f"owner{i}@example.com", "Offer", f"body {i}")) for i in range(5)]
+    results = _send(messages)
+    assert results == [(i, "sent", None) for i in range(5)]
+    assert len(smtp.messages) == 5
+    assert len(smtp.sessions) == 1
+    assert "From: offers@example.com" in smtp.messages[0]
+
+
+def test_sender_records_rejections_and_continues(smtp):
+    messages = [
+        (1, mailer.build_message("reject@example.com", "Offer", "body")),
+        (2, mailer.build_message("owner@example.com", "Offer", "body")),
+    ]
+    results = _send(messages)
+    assert [(pk, status) for pk, status, _ in results] == [(1, "failed"), (2, "sent")]
+    assert "550" in results[0][2]
+    assert len(smtp.messages) == 1
@@ -0,0 +1,29 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import models
+from app.routers import owners
+from app.security_encryption import protect_contact
+
+
+@pytest.fixture
+def client(db_tables):
+    db = db_tables("owners")
+    db.add(models.Owner(name="Jane Roe", **protect_contact("jane@example.com", "(512) 555-0142")))
+    # written before blind indexes existed
+    db.add(models.Owner(name="John Doe"))
+    db.commit()
+    app = FastAPI()
+    app.include_router(owners.router)
+    return TestClient(app)
+
+
+def test_lookup_by_contact(client):
+    items = client.get("/owners/", params={"phone": "512.555.0142"}).json()["items"]
+    assert [o["name"] for o in items] == ["Jane Roe"]
+    assert client.get("/owners/", params={"email": "JANE@example.com"}).json()["items"][0]["name"] == "Jane Roe"
+
+
+@pytest.mark.parametrize("params", [{"phone": ""}, {"phone": "anonymous"}, {"email": ""}])
+def test_lookup_without_indexable_value_is_rejected(client, params):
+    assert client.get("/owners/", params=params).status_code == 400
@@ -0,0 +1,38 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app import models
+from app.pagination import decode_cursor, encode_cursor
+from app.routers import campaigns
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor([12.5, 7]), (int, float), int) == [12.5, 7]
+    assert decode_cursor(encode_cursor([3, 7]), (int, float), int) == [3, 7]
+    assert decode_cursor(None, int) is None
+
+
+@pytest.mark.parametrize("values, types", [
+    (["x"], (int,)),
+    ([1, 2], (int,)),
+    ([], (int,)),
+    ([True], (int,)),
+    ([1.5], (int,)),
+    ({"id": 1}, (int,)),
+    (["x", 1], ((int, float), int)),
+    ([1.0, "2"], ((int, float), int)),
+])
+def test_rejects_wrong_values(values, types):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(encode_cursor(values), *types)
+    assert e.value.status_code == 400
+
+
+def test_list_endpoint_rejects_crafted_cursor(db_tables):
+    db_tables("campaigns")
+    app = FastAPI()
+    app.include_router(campaigns.router)
+    client = TestClient(app)
+    assert client.get("/campaigns/", params={"cursor": encode_cursor(["x"])}).status_code == 400
+    assert client.get("/campaigns/", params={"cursor": "!!"}).status_code == 400
+    assert client.get("/campaigns/", params={"cursor": encode_cursor([10])}).json() == {"items": [], "next_cursor": None}
@@ -0,0 +1,56 @@
+from app import tiles
+
+
+class FakeRedis:
+    # the handful of commands tiles.py uses
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, *keys):
+        return [self.data.get(k) for k in keys]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key) or {})
+
+    def hset(self, key, mapping):
+        self.data[key] = {k.encode(): v.encode() if isinstance(v, str) else v for k, v in mapping.items()}
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+
+def test_render_overlapping_invalidation_is_not_served(monkeypatch):
+    monkeypatch.setattr(tiles, "_client", FakeRedis())
+    renders = []
+
+    def render(db, z, x, y):
+        renders.append((z, x, y))
+        if len(renders) == 1:
+            # the parcel's update commits and invalidates while this render still sees the old row
+            tiles.invalidate_bounds(-97.8, 30.2, -97.7, 30.3)
+            return b"before"
+        return b"after"
+
+    monkeypatch.setattr(tiles, "render_tile", render)
+    z, x, y = 10, *tiles.tile_range(10, -97.8, 30.2, -97.7, 30.3)[:2]
+    assert tiles.get_tile(None, z, x, y)[0] == b"before"
+    assert tiles.get_tile(None, z, x, y)[0] == b"after"
+    assert tiles.get_tile(None, z, x, y)[0] == b"after"
+    assert len(renders) == 2
+
+    tiles.invalidate_all()
+    assert tiles.get_tile(None, z, x, y)[0] == b"after"
+    assert len(renders) == 3
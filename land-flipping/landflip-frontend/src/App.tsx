@@ -34,6 +34,37 @@ type Campaign = { id: number; name: string; channel?: string; description?: stri
 
 type AuctionSource = { id: number; name: string; url: string; county?: string; state?: string; country?: string };
 
+type Page<T> = { items: T[]; next_cursor?: string | null };
+
+type IngestJob = { id: number; status: "queued" | "running" | "failed" | "done"; rows_done: number; geoms_dropped: number; error?: string | null };
+
+// uploads are loaded by a background job; poll it until it finishes
+async function waitForJob(id: number, onProgress: (job: IngestJob) => void): Promise<IngestJob> {
+  for (;;) {
+    const res = await fetch(`${API}/parcels/ingest-jobs/${id}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const job: IngestJob = await res.json();
+    if (job.status === "done" || job.status === "failed") return job;
+    onProgress(job);
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+  }
+}
+
+// list endpoints return keyset pages; follow next_cursor until the list ends or `max` rows are loaded
+async function fetchAll<T>(path: string, params: Record<string, string> = {}, max = Infinity): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null | undefined;
+  do {
+    const qs = new URLSearchParams({ ...params, limit: String(Math.min(1000, max - items.length)) });
+    if (cursor) qs.set("cursor", cursor);
+    const res = await fetch(`${API}${path}?${qs.toString()}`);
+    const page = (await res.json()) as Page<T>;
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor && items.length < max);
+  return items;
+}
+
 function useCompanyInfo() {
   const [company, setCompany] = useState(() => {
     const raw = localStorage.getItem("company_info");
@@ -97,7 +128,17 @@ export default function App() {
       form.append("file", file);
       const res = await fetch(`${API}${endpoint}`, { method: "POST", body: form });
       const json = await res.json();
-      setMessage(`Ingested ${json.ingested} rows`);
+      if (!res.ok) {
+        setMessage(`Upload failed: ${json.detail ?? res.status}`);
+        return;
+      }
+      setMessage(`Ingest job #${json.id} queued`);
+      const job = await waitForJob(json.id, (j) => setMessage(`Ingest job #${j.id} ${j.status}: ${j.rows_done} rows`));
+      if (job.status === "failed") {
+        setMessage(`Ingest failed after ${job.rows_done} rows: ${job.error ?? "unknown error"}`);
+        return;
+      }
+      setMessage(`Ingested ${job.rows_done} rows` + (job.geoms_dropped ? ` (${job.geoms_dropped} non-polygon geometries skipped)` : ""));
       await refreshGeoJSON();
       await loadParcels();
     } catch (err) {
@@ -108,21 +149,16 @@ export default function App() {
   }
 
   async function loadParcels() {
-    const qs = new URLSearchParams(Object.entries(filters).filter(([_, v]) => v));
-    const res = await fetch(`${API}/parcels?${qs.toString()}`);
-    const data = (await res.json()) as Parcel[];
-    setParcels(data);
+    const params = Object.fromEntries(Object.entries(filters).filter(([_, v]) => v));
+    setParcels(await fetchAll<Parcel>("/parcels/", params, 500));
   }
 
   async function loadCampaigns() {
-    const res = await fetch(`${API}/campaigns/`);
-    const data = (await res.json()) as Campaign[];
-    setCampaigns(data);
+    setCampaigns(await fetchAll<Campaign>("/campaigns/"));
   }
 
   async function loadSources() {
-    const res = await fetch(`${API}/auctions/sources`);
-    setSources(await res.json());
+    setSources(await fetchAll<AuctionSource>("/auctions/sources"));
   }
 
   useEffect(() => {